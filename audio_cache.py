@@ -0,0 +1,173 @@
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES, SHARD_WORKER
+
+logger = logging.getLogger("AudioCache")
+
+INDEX_FILE = "cache_index.sqlite3"
+ORPHAN_MIN_AGE = 600  # Un fichier non indexé plus récent est peut-être en cours de rangement par un autre processus
+
+
+class AudioCache:
+    """Cache des fichiers audio téléchargés, indexé par identifiant de vidéo, avec éviction LRU.
+
+    Le dossier et l'index sont partagés par tous les processus du bot ; seuls les téléchargements en
+    cours sont séparés (un sous-dossier temporaire par processus). Les méthodes qui touchent au disque
+    s'appellent via asyncio.to_thread : un autre processus peut tenir l'index en écriture.
+    """
+
+    def __init__(self, folder: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MAX_BYTES, worker: int = SHARD_WORKER):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        # Téléchargements en cours, déplacés une fois complets
+        self.tmp_folder = os.path.join(folder, ".tmp", f"worker-{worker}")
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # Octets non re-téléchargés grâce au cache
+
+        os.makedirs(self.folder, exist_ok=True)
+        shutil.rmtree(self.tmp_folder, ignore_errors=True)  # Restes d'un téléchargement interrompu
+        os.makedirs(self.tmp_folder, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(folder, INDEX_FILE), timeout=10, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")  # Index lu et écrit par plusieurs processus
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " video_id TEXT PRIMARY KEY, filename TEXT NOT NULL, title TEXT, duration REAL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        # Niveau mesuré à la première écoute (fichier téléchargé ou flux), gardé même après éviction du fichier
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS loudness (video_id TEXT PRIMARY KEY, loudness REAL NOT NULL, measured_at REAL NOT NULL)"
+        )
+        self.db.commit()
+        self._reconcile()
+        self._entries, self._total_bytes = self._count()  # Relus après chaque écriture, pour les statistiques
+
+    def _count(self):
+        return self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.folder, filename)
+
+    def _reconcile(self):
+        """Aligne l'index sur le contenu du dossier après un redémarrage."""
+        indexed = set()
+        for video_id, filename in self.db.execute("SELECT video_id, filename FROM entries").fetchall():
+            if os.path.isfile(self._path(filename)):
+                indexed.add(filename)
+            else:
+                self.db.execute("DELETE FROM entries WHERE video_id = ?", (video_id,))
+        self.db.commit()
+
+        # Fichiers non indexés (anciens noms "{titre}.mp3") : ils ne peuvent plus être retrouvés
+        for filename in os.listdir(self.folder):
+            path = self._path(filename)
+            if filename.startswith(INDEX_FILE) or filename in indexed or not os.path.isfile(path):
+                continue
+            if time.time() - os.path.getmtime(path) < ORPHAN_MIN_AGE:
+                continue
+            try:
+                os.remove(path)
+                logger.info(f"🧹 Fichier hors cache supprimé : {filename}")
+            except OSError as e:
+                logger.error(f"❌ Erreur lors de la suppression de {filename}: {e}")
+
+    @property
+    def total_bytes(self) -> int:
+        """Taille du cache lors du dernier accès à l'index (sans requête : lue depuis la boucle)."""
+        return self._total_bytes
+
+    def get(self, video_id: str):
+        """Retourne l'entrée du cache (chemin, titre, durée, taille) et la marque comme récemment utilisée."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT filename, title, duration, size FROM entries WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None or not os.path.isfile(self._path(row[0])):
+                self.misses += 1
+                return None
+            with self.db:
+                self.db.execute("UPDATE entries SET last_access = ? WHERE video_id = ?", (time.time(), video_id))
+            self.hits += 1
+            self.bytes_saved += row[3]
+        return {'file_path': self._path(row[0]), 'title': row[1], 'duration': row[2], 'filesize': row[3]}
+
+    def loudness(self, video_id: str):
+        """Niveau RMS (dBFS) mesuré pour cette vidéo, None si elle n'a jamais été écoutée jusqu'au bout."""
+        with self._lock:
+            row = self.db.execute("SELECT loudness FROM loudness WHERE video_id = ?", (video_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_loudness(self, video_id: str, loudness: float):
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO loudness (video_id, loudness, measured_at) VALUES (?, ?, ?)",
+                (video_id, loudness, time.time()),
+            )
+
+    def tmp_template(self) -> str:
+        """Modèle de nom yt-dlp pour télécharger dans le dossier temporaire."""
+        return os.path.join(self.tmp_folder, "%(id)s.%(ext)s")
+
+    def store(self, video_id: str, tmp_path: str, title: str = None, duration: float = None) -> str:
+        """Déplace atomiquement un fichier téléchargé dans le cache et retourne son chemin final."""
+        filename = f"{video_id}{os.path.splitext(tmp_path)[1]}"
+        path = self._path(filename)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries (video_id, filename, title, duration, size, last_access)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (video_id, filename, title, duration, size, time.time()),
+                )
+            self._evict(keep=video_id)
+            self._entries, self._total_bytes = self._count()
+        return path
+
+    def _evict(self, keep: str = None):
+        """Supprime les entrées les moins récemment utilisées tant que le budget est dépassé (sous verrou)."""
+        total = self._count()[1]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute("SELECT video_id, filename, size FROM entries ORDER BY last_access").fetchall()
+        for video_id, filename, size in rows:
+            if total <= self.max_bytes:
+                break
+            if video_id == keep:
+                continue
+            try:
+                os.remove(self._path(filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Fichier encore ouvert par FFmpeg (Windows) : on réessaiera à la prochaine éviction
+                logger.warning(f"⚠️ Éviction impossible pour {filename} : {e}")
+                continue
+            self.db.execute("DELETE FROM entries WHERE video_id = ?", (video_id,))
+            total -= size
+            logger.info(f"🧹 Éviction du cache : {filename} ({size} octets)")
+        self.db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def close(self):
+        with self._lock:
+            self.db.close()
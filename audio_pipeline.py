@@ -0,0 +1,195 @@
+import audioop
+import logging
+import math
+import threading
+import time
+import discord
+from config import CROSSFADE_SECONDS, LOUDNESS_TARGET, LOUDNESS_MAX_GAIN
+
+logger = logging.getLogger("AudioPipeline")
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE  # 20 ms de PCM 48 kHz stéréo 16 bits
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+SILENCE_RMS = 64  # Trames plus faibles ignorées par la mesure (silences, fondus)
+MIN_MEASURED_SECONDS = 10  # En dessous, la mesure d'une piste terminée n'est pas fiable
+PARTIAL_MEASURE_SECONDS = 60  # Une piste passée après une minute d'écoute est tout de même mesurée
+
+
+def gain_for(loudness_db) -> float:
+    """Facteur de gain qui amène une piste mesurée à LOUDNESS_TARGET (1.0 si elle n'a pas encore été mesurée)."""
+    if loudness_db is None:
+        return 1.0
+    return 10 ** (min(LOUDNESS_TARGET - loudness_db, LOUDNESS_MAX_GAIN) / 20)
+
+
+class TrackSource:
+    """Une piste du pipeline : source PCM (FFmpeg) avec son gain de normalisation et sa mesure de volume."""
+
+    def __init__(self, entry, source: discord.AudioSource, video_id: str = None, duration: float = None,
+                 start_at: float = 0.0, gain: float = 1.0, measure: bool = False, on_start=None):
+        self.entry = entry  # Piste de la file (Track) correspondante
+        self.source = source  # Créée à l'avance : le processus FFmpeg décode déjà dans son tube
+        self.video_id = video_id
+        self.duration = duration
+        self.gain = gain
+        self.measure = measure
+        self.on_start = on_start  # Appelé (depuis le thread audio) à la première trame émise
+        self.position = start_at
+        self.completed = False  # Lue jusqu'au bout (et non passée ou arrêtée)
+        self._sum_squares = 0.0
+        self._measured_frames = 0
+
+    @property
+    def remaining(self):
+        """Secondes restantes, None si la durée est inconnue."""
+        return self.duration - self.position if self.duration else None
+
+    def read(self) -> bytes:
+        data = self.source.read()
+        if len(data) != FRAME_SIZE:
+            self.completed = True
+            return b""
+        if self.on_start is not None:
+            callback, self.on_start = self.on_start, None
+            callback(time.monotonic())
+        self.position += FRAME_SECONDS
+        if self.measure:
+            rms = audioop.rms(data, 2)
+            if rms > SILENCE_RMS:
+                self._sum_squares += rms * rms
+                self._measured_frames += 1
+        if self.gain != 1.0:
+            data = audioop.mul(data, 2, self.gain)
+        return data
+
+    def loudness(self):
+        """Niveau RMS moyen (dBFS) des passages non silencieux, None si la mesure est insuffisante."""
+        measured = self._measured_frames * FRAME_SECONDS
+        if not self.measure or measured < (MIN_MEASURED_SECONDS if self.completed else PARTIAL_MEASURE_SECONDS):
+            return None
+        return 20 * math.log10(math.sqrt(self._sum_squares / self._measured_frames) / 32768)
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class AudioPipeline(discord.AudioSource):
+    """Source audio d'un serveur qui enchaîne les pistes sans relancer la lecture du client vocal.
+
+    La piste suivante est armée à l'avance (`set_next`) : son FFmpeg tourne déjà quand la piste en cours
+    se termine, le passage se fait d'une trame à l'autre, avec un fondu enchaîné si `crossfade` > 0.
+    Le volume du serveur est appliqué à chaque trame, sans redémarrer FFmpeg. Sans piste armée à la fin
+    de la piste en cours, la source se termine et le client vocal appelle son `after` comme avant.
+
+    Les rappels sont faits depuis le thread audio de discord.py.
+    """
+
+    def __init__(self, volume: float = 1.0, crossfade: float = CROSSFADE_SECONDS, on_track_start=None, on_track_end=None):
+        self.volume = volume
+        self.crossfade = crossfade
+        self.on_track_start = on_track_start  # (piste) : une piste armée devient la piste en cours
+        self.on_track_end = on_track_end  # (piste) : une piste n'est plus lue (terminée, passée ou arrêtée)
+        self.current = None
+        self.upcoming = None
+        self.tracks_started = 0
+        self._skip = False
+        self._retired = []  # Pistes désarmées, nettoyées par le thread audio (qui pouvait être en train de les lire)
+        self.closed = False  # Nettoyé par le client vocal : plus aucune lecture ni nettoyage à venir
+        # read() dans le thread audio, set_next()/skip() depuis la boucle asyncio. Le verrou ne protège que
+        # l'échange des pistes : les lectures, qui peuvent bloquer sur le tube de FFmpeg, se font hors verrou.
+        self._lock = threading.Lock()
+
+    def start(self, track: TrackSource):
+        self.current = track
+        self.tracks_started += 1
+
+    def set_next(self, track):
+        """Arme (ou désarme avec None) la piste qui suivra la piste en cours.
+
+        Une piste armée sur un pipeline déjà nettoyé (lecture terminée pendant son armement) est nettoyée aussitôt.
+        """
+        with self._lock:
+            if not self.closed:
+                previous, self.upcoming = self.upcoming, track
+                if track is None:
+                    self._skip = False
+                if previous is not None and previous is not track:
+                    self._retired.append(previous)
+                return
+        if track is not None:
+            track.cleanup()
+
+    def skip(self) -> bool:
+        """Passe immédiatement à la piste armée ; False s'il n'y en a pas."""
+        with self._lock:
+            if self.upcoming is None:
+                return False
+            self._skip = True
+            return True
+
+    def _swap(self):
+        """Fait de la piste armée la piste en cours (sous verrou) ; retourne la piste terminée."""
+        finished, self.current, self.upcoming = self.current, self.upcoming, None
+        self._skip = False
+        self.tracks_started += 1
+        return finished
+
+    def _finish(self, finished, started):
+        """Nettoie la piste terminée et prévient le lecteur, hors verrou."""
+        finished.cleanup()
+        if self.on_track_end:
+            self.on_track_end(finished)
+        if self.on_track_start:
+            self.on_track_start(started)
+
+    def read(self) -> bytes:
+        with self._lock:
+            swapped = self._swap() if self._skip and self.upcoming is not None else None
+            current, upcoming = self.current, self.upcoming
+            retired, self._retired = self._retired, []
+        for track in retired:
+            track.cleanup()
+        if swapped is not None:
+            self._finish(swapped, current)
+        if current is None:
+            return b""
+
+        data = current.read()
+        remaining = current.remaining
+        if data and upcoming and self.crossfade > 0 and remaining is not None and remaining <= self.crossfade:
+            incoming = upcoming.read()
+            if incoming:
+                fade = max(remaining, 0.0) / self.crossfade
+                data = audioop.add(audioop.mul(data, 2, fade), audioop.mul(incoming, 2, 1.0 - fade), 2)
+        if not data:
+            with self._lock:
+                if self.current is not current or self.upcoming is None:
+                    return b""
+                finished = self._swap()
+                current = self.current
+            self._finish(finished, current)
+            data = current.read()
+            if not data:
+                return b""
+
+        if self.volume != 1.0:
+            data = audioop.mul(data, 2, self.volume)
+        return data
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        with self._lock:
+            current, upcoming, retired = self.current, self.upcoming, self._retired
+            self.current = self.upcoming = None
+            self._retired = []
+            self.closed = True
+        for track in retired:
+            track.cleanup()
+        if upcoming is not None:
+            upcoming.cleanup()
+        if current is not None:
+            current.cleanup()
+            if self.on_track_end:
+                self.on_track_end(current)
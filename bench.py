@@ -0,0 +1,599 @@
+"""
+Banc d'essai hors ligne du bot musical.
+
+Aucun accès à Discord ni à YouTube : une fausse passerelle (bot, salons, client vocal qui consomme les
+trames audio) et un faux extracteur yt-dlp (latence réglable, fichiers audio locaux) remplacent les
+services réels. Le cog MusicSlash, son pool d'extraction et ses caches sont les vrais.
+
+Exemples :
+    python bench.py --workload play --guilds 50 --users 5
+    python bench.py --workload skip --guilds 20 --skips 30
+    python bench.py --workload playlist --guilds 10 --playlist-size 500
+    python bench.py --workload search --guilds 5
+    python bench.py --workload all --compare
+
+Chaque exécution ajoute une ligne JSON (avec le commit courant) à bench_output.txt pour comparer les commits.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import wave
+import zlib
+from collections import Counter, defaultdict
+
+os.environ.setdefault("DISCORD_TOKEN", "banc-d-essai-hors-ligne")
+os.environ.setdefault("METRICS_PORT", "0")
+
+import discord
+from extractor import ExtractionPool, ExtractionCancelled
+import music
+from music import MusicSlash
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FRAME_BYTES = discord.opus.Encoder.FRAME_SIZE  # 20 ms de PCM 48 kHz stéréo 16 bits
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+# Recherches libres du scénario search : les crochets ne doivent pas être pris pour un lien
+SEARCH_QUERIES = ("[MV] BTS Dynamite", "lofi [1 hour]", "song]", "daft punk around the world")
+
+
+def percentile(values: list, q: float):
+    """Percentile exact (interpolation linéaire), None sans valeur."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q
+    low, high = math.floor(position), math.ceil(position)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def write_fixture(path: str, seconds: float):
+    """Écrit un fichier WAV 48 kHz stéréo (sinusoïde à 440 Hz) servant de piste audio locale."""
+    frames = int(48000 * seconds)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(48000)
+        samples = (int(8000 * math.sin(2 * math.pi * 440 * i / 48000)) for i in range(frames))
+        wav.writeframes(b"".join(struct.pack("<hh", s, s) for s in samples))
+
+
+class FixtureSource(discord.AudioSource):
+    """Lit le WAV local trame par trame, comme le ferait FFmpegPCMAudio (sans FFmpeg)."""
+
+    def __init__(self, path: str, start_at: float = 0.0):
+        self.wav = wave.open(path, "rb")
+        if start_at:
+            self.wav.setpos(min(int(start_at * 48000), self.wav.getnframes()))
+
+    def read(self) -> bytes:
+        data = self.wav.readframes(SAMPLES_PER_FRAME)
+        return data if len(data) == FRAME_BYTES else b""
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        self.wav.close()
+
+
+class FakeExtractionPool(ExtractionPool):
+    """Vrai pool d'extraction dont les appels yt-dlp sont simulés : latence réglable, fichiers locaux."""
+
+    def __init__(self, fixture: str, latency: float, jitter: float, playlist_size: int, **kwargs):
+        super().__init__(**kwargs)
+        self.fixture = fixture
+        self.latency = latency
+        self.jitter = jitter
+        self.playlist_size = playlist_size
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+
+    def _extract_info(self, cancel_event, url, ydl_opts, download, kind):
+        with self._calls_lock:
+            self.calls[kind] += 1
+        # Latence simulée, interruptible comme le serait un téléchargement yt-dlp
+        if cancel_event.wait(max(0.0, random.gauss(self.latency, self.latency * self.jitter))):
+            raise ExtractionCancelled()
+
+        if kind == "search":
+            query = url.split(":", 1)[1]
+            return {'entries': [{'id': f"search{zlib.crc32(query.encode()) % 100000:05d}", 'title': query, 'duration': 1}]}
+
+        if kind == "playlist":
+            start, end = map(int, ydl_opts['playlist_items'].split("-"))
+            return {'entries': [
+                {'id': f"playlist{n:03d}", 'title': f"Piste de playlist {n}"}
+                for n in range(start, min(end, self.playlist_size) + 1)
+            ]}
+
+        video_id = MusicSlash.video_id_from_url(url)
+        info = {'id': video_id, 'title': f"Piste {video_id}", 'duration': 1, 'url': self.fixture,
+                'acodec': 'pcm_s16le', 'asr': 48000, 'formats': []}
+        if download:
+            tmp_path = os.path.join(os.path.dirname(ydl_opts['outtmpl']), f"{video_id}.mp3")
+            shutil.copyfile(self.fixture, tmp_path)
+        return info
+
+
+class Recorder:
+    """Horodatages des requêtes /play et des premières trames, par serveur."""
+
+    def __init__(self):
+        self.requests = defaultdict(list)
+        self.first_audio = defaultdict(list)
+        self.frames = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def audio_started(self, guild_id: int, when: float):
+        with self._lock:
+            self.first_audio[guild_id].append(when)
+
+    def time_to_first_audio(self) -> list:
+        """Associe la i-ème requête d'un serveur à la i-ème piste lancée (les pistes sont lues dans l'ordre)."""
+        return [
+            audio - request
+            for guild_id, requests in self.requests.items()
+            for request, audio in zip(requests, self.first_audio[guild_id])
+        ]
+
+
+class FakeVoiceClient:
+    """Client vocal factice : un thread par lecture consomme les trames au rythme réel accéléré par `speed`."""
+
+    def __init__(self, channel, recorder: Recorder, speed: float):
+        self.channel = channel
+        self.recorder = recorder
+        self.frame_delay = 0.02 / speed
+        self.connected = True
+        self._source = None
+        self._paused = False
+        self._stop_event = None
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def is_playing(self) -> bool:
+        return self._source is not None and not self._paused
+
+    def is_paused(self) -> bool:
+        return self._source is not None and self._paused
+
+    def play(self, source, after=None):
+        if self._source is not None:
+            raise discord.ClientException("Already playing audio.")
+        self._source = source
+        self._paused = False
+        self._stop_event = stop_event = threading.Event()
+        threading.Thread(target=self._run, args=(source, after, stop_event), daemon=True).start()
+
+    def _run(self, source, after, stop_event):
+        started = None
+        while not stop_event.is_set():
+            if self._paused:
+                stop_event.wait(self.frame_delay)
+                continue
+            data = source.read()
+            # Le pipeline audio enchaîne plusieurs pistes dans une même source
+            tracks = getattr(source, "tracks_started", 1)
+            if tracks != started:
+                self.recorder.audio_started(self.channel.guild.id, time.monotonic())
+                started = tracks
+            if not data:
+                break
+            self.recorder.frames += 1
+            stop_event.wait(self.frame_delay)
+        source.cleanup()
+        if self._stop_event is stop_event:
+            self._source = None
+        if after is not None:
+            after(None)
+
+    def stop(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
+        self._source = None
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    async def disconnect(self, force: bool = False):
+        self.stop()
+        self.connected = False
+        self.channel.guild.voice_client = None
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.voice_client = None
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild: FakeGuild, recorder: Recorder, speed: float):
+        self.id = guild.id * 10 + 1
+        self.name = f"vocal-{guild.id}"
+        self.guild = guild
+        self.recorder = recorder
+        self.speed = speed
+
+    async def connect(self):
+        self.guild.voice_client = FakeVoiceClient(self, self.recorder, self.speed)
+        return self.guild.voice_client
+
+
+class FakeTextChannel:
+    """Salon texte : simule la latence REST de chaque envoi."""
+
+    def __init__(self, channel_id: int, recorder: Recorder, rest_latency: float):
+        self.id = channel_id
+        self.recorder = recorder
+        self.rest_latency = rest_latency
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.rest_latency)
+        self.recorder.messages += 1
+        return FakeMessage(self.rest_latency)
+
+
+class FakeMessage:
+    def __init__(self, rest_latency: float):
+        self.rest_latency = rest_latency
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.rest_latency)
+
+
+class FakeResponse:
+    def __init__(self, rest_latency: float):
+        self.rest_latency = rest_latency
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def send_message(self, content=None, **kwargs):
+        await asyncio.sleep(self.rest_latency)
+        self.done = True
+
+    async def defer(self, **kwargs):
+        self.done = True
+
+    async def send_modal(self, modal):
+        self.done = True
+
+
+class FakeFollowup:
+    def __init__(self, rest_latency: float):
+        self.rest_latency = rest_latency
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.rest_latency)
+        return FakeMessage(self.rest_latency)
+
+
+class FakeUser:
+    def __init__(self, user_id: int, voice_channel: FakeVoiceChannel):
+        self.id = user_id
+        self.voice = type("VoiceState", (), {"channel": voice_channel})()
+        self.guild_permissions = discord.Permissions.all()
+
+
+class FakeInteraction:
+    """Interaction minimale : ce que lit le cog MusicSlash."""
+    ids = itertools.count(1)
+
+    def __init__(self, guild: FakeGuild, user: FakeUser, channel_id: int, rest_latency: float):
+        self.id = next(FakeInteraction.ids)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel_id = channel_id
+        self.response = FakeResponse(rest_latency)
+        self.followup = FakeFollowup(rest_latency)
+        self.rest_latency = rest_latency
+
+    async def edit_original_response(self, **kwargs):
+        await asyncio.sleep(self.rest_latency)
+
+
+class FakeGateway:
+    """Remplace commands.Bot : fournit la boucle, les salons et les serveurs simulés."""
+
+    def __init__(self, loop, recorder: Recorder, rest_latency: float):
+        self.loop = loop
+        self.recorder = recorder
+        self.rest_latency = rest_latency
+        self.user = object()
+        self.latency = 0.0
+        self.channels = {}
+        self._never = asyncio.Event()
+
+    def get_channel(self, channel_id: int):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = FakeTextChannel(channel_id, self.recorder, self.rest_latency)
+        return channel
+
+    def get_cog(self, name: str):
+        return None
+
+    def dispatch(self, event: str, *args):
+        pass
+
+    async def wait_until_ready(self):
+        await self._never.wait()
+
+
+class Bench:
+    """Un cog MusicSlash réel branché sur la fausse passerelle, avec N serveurs et M utilisateurs par serveur."""
+
+    def __init__(self, args, workdir: str):
+        self.args = args
+        self.recorder = Recorder()
+        self.fixture = os.path.join(workdir, "fixture.wav")
+        write_fixture(self.fixture, args.track_seconds)
+        self.gateway = FakeGateway(asyncio.get_running_loop(), self.recorder, args.rest_latency)
+
+        self.cog = MusicSlash(self.gateway)
+        self.cog.extractor.shutdown()
+        self.cog.extractor = FakeExtractionPool(
+            self.fixture, args.latency, args.jitter, args.playlist_size,
+            **({'max_workers': args.workers} if args.workers else {})
+        )
+        if not args.ffmpeg:
+            self.cog.create_audio_source = lambda track, start_at=0.0, passthrough=True: FixtureSource(
+                track['file_path'] or track['url'], start_at)
+
+        self.guilds = []
+        for g in range(args.guilds):
+            guild = FakeGuild(1000 + g)
+            voice = FakeVoiceChannel(guild, self.recorder, args.speed)
+            users = [FakeUser(guild.id * 100 + u, voice) for u in range(args.users)]
+            self.guilds.append((guild, users))
+            self.cog.playback_modes[guild.id] = args.mode
+
+    def interaction(self, guild: FakeGuild, user: FakeUser) -> FakeInteraction:
+        return FakeInteraction(guild, user, guild.id * 10 + 2, self.args.rest_latency)
+
+    def song_url(self) -> str:
+        # Identifiants de 11 caractères, comme les vrais : /play ne reconnaît pas les autres comme des liens
+        return f"https://www.youtube.com/watch?v=bench{random.randrange(self.args.catalog):06d}"
+
+    async def play(self, guild, user, url: str):
+        self.recorder.requests[guild.id].append(time.monotonic())
+        await self.cog.play_music_from_panel(self.interaction(guild, user), url)
+
+    def idle(self) -> bool:
+        for player in self.cog.players.players.values():
+            busy_voice = player.voice_client and (player.voice_client.is_playing() or player.voice_client.is_paused())
+            if player.queue or player.is_loading() or busy_voice or (player.task and not player.task.done()):
+                return False
+        return True
+
+    async def wait_idle(self):
+        deadline = time.monotonic() + self.args.timeout
+        await asyncio.sleep(0.05)
+        while not self.idle():
+            if time.monotonic() > deadline:
+                raise TimeoutError("Le scénario n'a pas terminé dans le délai imparti")
+            await asyncio.sleep(0.05)
+
+    async def workload_play(self):
+        """Chaque utilisateur de chaque serveur envoie `tracks` /play en rafale."""
+        async def spam(guild, user):
+            for _ in range(self.args.tracks):
+                await self.play(guild, user, self.song_url())
+                await asyncio.sleep(random.uniform(0, 0.01))
+
+        await asyncio.gather(*(spam(guild, user) for guild, users in self.guilds for user in users))
+        await self.wait_idle()
+
+    async def workload_skip(self):
+        """Remplit chaque file puis enchaîne `skips` passages à la piste suivante."""
+        for guild, users in self.guilds:
+            for i in range(self.args.skips + 1):
+                await self.play(guild, users[i % len(users)], self.song_url())
+
+        async def storm(guild, users):
+            for i in range(self.args.skips):
+                await asyncio.sleep(random.uniform(0.005, 0.05))
+                await self.cog.skip_music(self.interaction(guild, users[i % len(users)]))
+
+        await asyncio.gather(*(storm(guild, users) for guild, users in self.guilds))
+        await self.wait_idle()
+
+    async def workload_playlist(self):
+        """Chaque serveur ajoute une playlist de `playlist_size` pistes (3 playlists distinctes au total)."""
+        for guild, users in self.guilds:
+            self.recorder.requests[guild.id].append(time.monotonic())
+            url = f"https://www.youtube.com/playlist?list=PLbench{guild.id % 3}"
+            await self.cog.play_music_from_panel(self.interaction(guild, users[0]), url)
+        await self.wait_idle()
+
+    async def workload_search(self):
+        """Recherches libres (dont des titres entre crochets) : autocomplétion puis /play, chaque piste doit être jouée."""
+        for guild, users in self.guilds:
+            for i, query in enumerate(SEARCH_QUERIES):
+                await self.cog.play_autocomplete(self.interaction(guild, users[i % len(users)]), query)
+                await self.play(guild, users[i % len(users)], query)
+        await self.wait_idle()
+        started = sum(len(times) for times in self.recorder.first_audio.values())
+        if started != len(SEARCH_QUERIES) * len(self.guilds):
+            raise RuntimeError(f"Recherches libres : {started} piste(s) lancée(s) sur {len(SEARCH_QUERIES) * len(self.guilds)}")
+
+    async def close(self):
+        for player in list(self.cog.players.players.values()):
+            player.reset()
+            if player.voice_client:
+                await player.voice_client.disconnect()
+        self.cog.extractor.shutdown()
+        self.cog.store.close()
+        self.cog.cache.close()
+
+
+async def sample_loop_lag(samples: list, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(loop.time() - start - interval, 0.0))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_workload(name: str, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench-bot-")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)  # Cache audio et sauvegarde des files dans un dossier jetable
+    random.seed(args.seed)
+    if args.tracemalloc:
+        tracemalloc.start()
+    try:
+        bench = Bench(args, workdir)
+        lag_samples = []
+        lag_task = asyncio.create_task(sample_loop_lag(lag_samples))
+        cpu_start, wall_start = time.process_time(), time.monotonic()
+        try:
+            await getattr(bench, f"workload_{name}")()
+        finally:
+            lag_task.cancel()
+        wall = time.monotonic() - wall_start
+        cpu = time.process_time() - cpu_start
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        await bench.close()
+    finally:
+        if args.tracemalloc:
+            tracemalloc.stop()
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ttfa = bench.recorder.time_to_first_audio()
+    started = sum(len(times) for times in bench.recorder.first_audio.values())
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "commit": git_commit(),
+        "workload": name,
+        "params": {key: getattr(args, key) for key in (
+            "guilds", "users", "tracks", "catalog", "skips", "playlist_size", "latency", "jitter",
+            "track_seconds", "speed", "rest_latency", "mode", "workers", "seed", "ffmpeg")},
+        "duration_s": round(wall, 3),
+        "tracks_started": started,
+        "throughput_tracks_per_s": round(started / wall, 2) if wall else None,
+        "frames": bench.recorder.frames,
+        "messages_sent": bench.recorder.messages,
+        "ttfa_p50_ms": ms(percentile(ttfa, 0.5)),
+        "ttfa_p99_ms": ms(percentile(ttfa, 0.99)),
+        "loop_lag_p99_ms": ms(percentile(lag_samples, 0.99)),
+        "loop_lag_max_ms": ms(max(lag_samples, default=None)),
+        "cpu_ms_per_guild": round(cpu * 1000 / args.guilds, 2),
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss else None,
+        "traced_kb_per_guild": round(traced_peak / 1024 / args.guilds, 1) if traced_peak else None,
+        "extractions": dict(bench.cog.extractor.calls),
+        "metadata_cache": bench.cog.metadata.stats(),
+        "audio_cache": {"hits": bench.cog.cache.hits, "misses": bench.cog.cache.misses},
+    }
+
+
+COMPARED = ("duration_s", "throughput_tracks_per_s", "ttfa_p50_ms", "ttfa_p99_ms", "loop_lag_p99_ms",
+            "loop_lag_max_ms", "cpu_ms_per_guild", "peak_rss_mb")
+
+
+def previous_result(path: str, result: dict):
+    """Dernier résultat enregistré pour le même scénario avec les mêmes paramètres."""
+    if not os.path.exists(path):
+        return None
+    match = None
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                old = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if old.get("workload") == result["workload"] and old.get("params") == result["params"]:
+                match = old
+    return match
+
+
+def print_result(result: dict, previous: dict = None):
+    print(f"\n=== {result['workload']} (commit {result['commit']}) ===")
+    for key in COMPARED + ("tracks_started", "frames", "messages_sent", "traced_kb_per_guild"):
+        value = result[key]
+        line = f"  {key:<26} {value}"
+        if previous and key in COMPARED and previous.get(key) and value is not None:
+            line += f"   ({(value - previous[key]) / previous[key]:+.1%} vs {previous['commit']})"
+        print(line)
+    print(f"  {'extractions':<26} {result['extractions']}")
+    print(f"  {'metadata_cache':<26} {result['metadata_cache']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Banc d'essai hors ligne du bot musical.")
+    parser.add_argument("--workload", choices=("play", "skip", "playlist", "search", "all"), default="all")
+    parser.add_argument("--guilds", type=int, default=10, help="Nombre de serveurs simulés")
+    parser.add_argument("--users", type=int, default=5, help="Utilisateurs par serveur")
+    parser.add_argument("--tracks", type=int, default=3, help="/play par utilisateur (scénario play)")
+    parser.add_argument("--catalog", type=int, default=50, help="Nombre de morceaux distincts (réutilisation = cache)")
+    parser.add_argument("--skips", type=int, default=20, help="Passages à la suite par serveur (scénario skip)")
+    parser.add_argument("--playlist-size", type=int, default=200, help="Taille des playlists (scénario playlist)")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latence moyenne d'une extraction (s)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Écart-type relatif de la latence d'extraction")
+    parser.add_argument("--rest-latency", type=float, default=0.05, help="Latence simulée des appels REST Discord (s)")
+    parser.add_argument("--track-seconds", type=float, default=2.0, help="Durée du fichier audio de test (s)")
+    parser.add_argument("--speed", type=float, default=20.0, help="Accélération de la lecture par rapport au temps réel")
+    parser.add_argument("--mode", choices=music.PLAYBACK_MODES, default="stream")
+    parser.add_argument("--workers", type=int, default=None, help="Taille du pool d'extraction (sinon config)")
+    parser.add_argument("--timeout", type=float, default=600, help="Délai maximal d'un scénario (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ffmpeg", action="store_true", help="Décoder le fichier de test avec le vrai FFmpeg")
+    parser.add_argument("--tracemalloc", action="store_true", help="Mesurer la mémoire Python allouée (plus lent)")
+    parser.add_argument("--output", default=os.path.join(REPO_DIR, "bench_output.txt"))
+    parser.add_argument("--verbose", action="store_true", help="Afficher les journaux du bot")
+    parser.add_argument("--compare", action="store_true", help="Comparer au dernier résultat identique enregistré")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    workloads = ("play", "skip", "playlist", "search") if args.workload == "all" else (args.workload,)
+    for name in workloads:
+        result = await run_workload(name, args)
+        print_result(result, previous_result(args.output, result) if args.compare else None)
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
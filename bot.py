@@ -1,11 +1,21 @@
-import os
+import time
+STARTED_AT = time.monotonic()  # Avant les autres imports : la durée du démarrage à froid les inclut
+import hashlib
+import io
+import json
 import logging
 import discord
 from discord.ext import commands
-from config import TOKEN
+from config import TOKEN, WATCHDOG_ENABLED, METRICS_PORT, SHARD_COUNT, SHARD_IDS, SHARD_WORKER, SUPERVISED
+from config import COMMAND_HASH_FILE
 from music import MusicSlash
 from control_panel import ControlPanel
 from logging_config import logger
+from heartbeat import heartbeat
+from error_handler import global_error_handler
+import metrics
+import outbound
+import watchdog
 
 # Configuration des intents
 intents = discord.Intents.default()
@@ -14,8 +24,18 @@ intents.guilds = True
 intents.voice_states = True
 intents.message_content = True
 
-# Création du bot
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Création du bot : avec SHARD_COUNT, ce processus ne se connecte qu'à ses shards (répartis par sharding.py)
+if SHARD_COUNT > 1:
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT,
+                                  shard_ids=SHARD_IDS or None)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
+
+metrics.gauge("bot_gateway_latency_seconds", "Latence de la passerelle Discord (heartbeat websocket).",
+              lambda: {(): bot.latency})
+STARTUP_SECONDS = metrics.gauge("bot_startup_seconds", "Durée écoulée depuis le lancement du processus (phase=imports|setup|ready).")
+COMMAND_SYNCS = metrics.counter("bot_command_sync_total", "Synchronisations de l'arbre de commandes (result=synced|skipped|failed).")
+STARTUP_SECONDS.set(time.monotonic() - STARTED_AT, phase="imports")
 
 async def load_cogs():
     """Charge les cogs de manière asynchrone."""
@@ -26,16 +46,69 @@ async def load_cogs():
     except Exception as e:
         logger.error(f"❌ Erreur lors du chargement des cogs : {e}")
 
+def command_tree_hash() -> str:
+    """Empreinte des commandes globales telles qu'envoyées à Discord (noms, options, descriptions)."""
+    commands_payload = sorted((command.to_dict(bot.tree) for command in bot.tree.get_commands()),
+                              key=lambda payload: (payload.get('type', 1), payload['name']))
+    payload = {'application_id': bot.application_id, 'commands': commands_payload}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+async def sync_commands(force: bool = False):
+    """Synchronise les commandes slash si elles ont changé depuis la dernière fois (ou si `force`).
+
+    La synchronisation est un appel REST global et limité : inutile de la refaire à chaque démarrage.
+    Retourne les commandes synchronisées, ou None si rien n'a changé.
+    """
+    tree_hash = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_FILE, "r") as f:
+            previous = f.read().strip()
+    except OSError:
+        previous = None
+    if not force and previous == tree_hash:
+        COMMAND_SYNCS.inc(result="skipped")
+        logger.info("✅ Commandes inchangées depuis la dernière synchronisation.")
+        return None
+    try:
+        synced = await bot.tree.sync()
+    except Exception:
+        COMMAND_SYNCS.inc(result="failed")
+        raise
+    with open(COMMAND_HASH_FILE, "w") as f:
+        f.write(tree_hash)
+    COMMAND_SYNCS.inc(result="synced")
+    logger.info(f"✅ {len(synced)} commandes synchronisées : {[cmd.name for cmd in synced]}")
+    return synced
+
 # Gestion des événements
 @bot.event
-async def on_ready():
-    """Événement déclenché lorsque le bot est prêt."""
+async def setup_hook():
+    """Prépare le bot avant la connexion à Discord : métriques, cogs et commandes.
+
+    Appelé une fois par démarrage, contrairement à on_ready qui revient à chaque reconnexion.
+    """
+    await metrics.start(port=METRICS_PORT + SHARD_WORKER if METRICS_PORT else 0)  # Un port par processus shard
+    heartbeat(bot)
+    if WATCHDOG_ENABLED:
+        watchdog.start()
     await load_cogs()
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f"✅ {len(synced)} commandes synchronisées : {[cmd.name for cmd in synced]}")
-    except Exception as e:
-        logger.error(f"❌ Erreur de synchronisation des commandes : {e}")
+    if SHARD_WORKER == 0:  # Les commandes sont globales : un seul processus les synchronise
+        try:
+            await sync_commands()
+        except Exception as e:
+            logger.error(f"❌ Erreur de synchronisation des commandes : {e}")
+    STARTUP_SECONDS.set(time.monotonic() - STARTED_AT, phase="setup")
+
+@bot.event
+async def on_ready():
+    """Événement déclenché lorsque le bot est prêt (aussi après chaque reconnexion complète)."""
+    if not STARTUP_SECONDS.read().get((("phase", "ready"),)):
+        ready_after = time.monotonic() - STARTED_AT
+        STARTUP_SECONDS.set(ready_after, phase="ready")
+        logger.info(f"⏱️ Prêt {ready_after:.1f} s après le lancement du processus.")
+        music_cog = bot.get_cog("MusicSlash")
+        if music_cog:
+            music_cog.extractor.warm_up()
     logger.info(f"✅ Bot prêt en tant que {bot.user} (ID : {bot.user.id})")
 
 @bot.event
@@ -49,33 +122,78 @@ async def on_resumed():
     logger.info("✅ Bot reconnecté avec succès.")
 
 @bot.event
-async def on_voice_state_update(member, before, after):
-    """Supprime les fichiers musicaux lorsque le bot quitte un canal vocal."""
-    if member == bot.user and before.channel and not after.channel:
-        logger.info("🔊 Le bot a quitté un salon vocal. Nettoyage des fichiers musicaux...")
-        music_dir = "music"
-        if os.path.exists(music_dir):
-            for file in os.listdir(music_dir):
-                try:
-                    os.remove(os.path.join(music_dir, file))
-                    logger.info(f"✅ Fichier supprimé : {file}")
-                except Exception as e:
-                    logger.error(f"❌ Erreur lors de la suppression de {file}: {e}")
-        else:
-            logger.warning("⚠️ Dossier 'music' introuvable.")
+async def on_error(event, *args, **kwargs):
+    """Erreur non gérée dans un événement : journalisée et ajoutée au résumé d'erreurs."""
+    await global_error_handler(bot, event, *args, **kwargs)
 
 # Commandes Slash
 @bot.tree.command(name="ping", description="Affiche la latence du bot.")
 async def ping(interaction: discord.Interaction):
     latency = round(bot.latency * 1000)
-    await interaction.response.send_message(f"🏓 Pong! Latence : {latency} ms")
+    message = f"🏓 Pong! Latence : {latency} ms"
+    music_cog = bot.get_cog("MusicSlash")
+    if music_cog:
+        stats = music_cog.extractor.stats()
+        message += f"\n📥 Extractions : {stats['running']}/{stats['workers']} actives, {stats['queue_depth']} en attente"
+        cache = music_cog.cache.stats()
+        message += (f"\n💾 Cache : {cache['hits']} succès / {cache['misses']} échecs, "
+                    f"{cache['bytes_saved'] // (1024 * 1024)} Mo économisés")
+        metadata = music_cog.metadata.stats()
+        message += (f"\n🧠 Métadonnées : {metadata['hits']} succès / {metadata['misses']} échecs, "
+                    f"{metadata['coalesced']} requêtes fusionnées")
+        ffmpeg = music_cog.governor.stats()
+        message += (f"\n🎛️ FFmpeg : {ffmpeg['running']}/{ffmpeg['limit']} actifs, {ffmpeg['waiting']} en attente, "
+                    f"{music_cog.voice_connections()} connexion(s) vocale(s)")
+    pending = outbound.SCHEDULER.stats()['pending']
+    message += f"\n📨 Envois en attente : {pending['interaction']} réponses, {pending['notification']} notifications"
+    await interaction.response.send_message(message)
     logger.info(f"Commande /ping utilisée. Latence : {latency} ms")
 
+def format_seconds(value):
+    """Affiche une durée issue d'un histogramme (None si aucune mesure)."""
+    if value is None:
+        return "—"
+    return "> 300 s" if value == float("inf") else f"≤ {value * 1000:.0f} ms" if value < 1 else f"≤ {value:g} s"
+
+@bot.tree.command(name="stats", description="Affiche les statistiques de performance du bot.")
+async def stats(interaction: discord.Interaction):
+    embed = discord.Embed(title="📊 Statistiques", color=discord.Color.red())
+    lag = metrics.LOOP_LAG_CURRENT.read().get((), 0)
+    embed.add_field(name="Passerelle", value=f"{round(bot.latency * 1000)} ms")
+    embed.add_field(name="Retard de la boucle", value=f"{lag * 1000:.1f} ms (p99 {format_seconds(metrics.LOOP_LAG_SECONDS.quantile(0.99))})")
+
+    for name, histogram, labels in (
+        ("Premier paquet après /play", metrics.TIME_TO_FIRST_AUDIO_SECONDS, {}),
+        ("Démarrage d'une piste", metrics.START_LATENCY_SECONDS, {}),
+        ("Attente dans la file", metrics.QUEUE_WAIT_SECONDS, {}),
+        ("Extraction yt-dlp", metrics.EXTRACTION_SECONDS, {"kind": "metadata"}),
+        ("Téléchargement + conversion", metrics.EXTRACTION_SECONDS, {"kind": "download"}),
+    ):
+        embed.add_field(name=name, value=(
+            f"p50 {format_seconds(histogram.quantile(0.5, **labels))} • "
+            f"p99 {format_seconds(histogram.quantile(0.99, **labels))} ({histogram.count(**labels)})"
+        ), inline=False)
+
+    music_cog = bot.get_cog("MusicSlash")
+    if music_cog:
+        cache, metadata, pool = music_cog.cache.stats(), music_cog.metadata.stats(), music_cog.extractor.stats()
+        ffmpeg = music_cog.governor.stats()
+        embed.add_field(name="Connexions vocales", value=str(music_cog.voice_connections()))
+        embed.add_field(name="Extractions", value=f"{pool['running']}/{pool['workers']} actives, {pool['queue_depth']} en attente")
+        embed.add_field(name="FFmpeg", value=(f"{ffmpeg['running']}/{ffmpeg['limit']} actifs, {ffmpeg['waiting']} en attente, "
+                                              f"{sum(ffmpeg['reaped'].values())} récupérés"))
+        embed.add_field(name="Cache audio", value=f"{cache['hit_rate']:.0%} de succès, {cache['bytes_saved'] // (1024 * 1024)} Mo économisés")
+        lookups = metadata['hits'] + metadata['misses'] + metadata['coalesced']
+        hit_rate = (metadata['hits'] + metadata['coalesced']) / lookups if lookups else 0
+        embed.add_field(name="Cache métadonnées", value=f"{hit_rate:.0%} de succès, {metadata['coalesced']} fusionnées")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+    logger.info("Commande /stats utilisée.")
+
 @bot.tree.command(name="sync", description="Force la synchronisation des commandes slash.")
 async def sync(interaction: discord.Interaction):
     if interaction.user.guild_permissions.administrator:
         try:
-            synced = await bot.tree.sync()
+            synced = await sync_commands(force=True)
             await interaction.response.send_message(f"✅ {len(synced)} commandes synchronisées.", ephemeral=True)
             logger.info("✅ Synchronisation manuelle réussie.")
         except Exception as e:
@@ -84,6 +202,30 @@ async def sync(interaction: discord.Interaction):
     else:
         await interaction.response.send_message("❌ Vous n'avez pas les permissions requises.", ephemeral=True)
 
+@bot.tree.command(name="profil", description="Profile la boucle d'événements et envoie un profil pour flamegraph.")
+async def profil(interaction: discord.Interaction, secondes: int = 0):
+    """Avec `secondes` > 0, échantillonne la boucle pendant cette durée ; sinon, envoie les blocages cumulés."""
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Vous n'avez pas les permissions requises.", ephemeral=True)
+        return
+    dog = watchdog.get()
+    if dog is None:
+        await interaction.response.send_message("❌ La surveillance de la boucle n'est pas activée (WATCHDOG_ENABLED=1).", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    if secondes > 0:
+        profile = await dog.profile(min(secondes, 60))
+        filename = f"profil-{secondes}s.folded"
+    else:
+        profile = dog.format_profile()
+        filename = "blocages.folded"
+    await interaction.followup.send(
+        "🔥 Profil au format replié (flamegraph.pl, speedscope).",
+        file=discord.File(io.BytesIO(profile.encode()), filename=filename), ephemeral=True
+    )
+    logger.info(f"Commande /profil utilisée ({filename}).")
+
 @bot.tree.command(name="debug", description="Effectue un test pour vérifier que le bot fonctionne.")
 async def debug(interaction: discord.Interaction):
     try:
@@ -102,16 +244,36 @@ async def on_command_error(ctx, error):
 # Démarrage avec relance automatique en cas d'erreur
 if __name__ == "__main__":
     import asyncio
+    import signal
 
     async def main():
-        """Lance le bot et relance en cas de crash."""
+        """Lance le bot et relance en cas de crash (sous sharding.py, la relance revient au superviseur)."""
+        try:
+            # Arrêt demandé par le superviseur : fermeture propre, les cogs sauvegardent leurs files
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            pass  # Windows
+
         while True:
             try:
-                logger.info("🚀 Démarrage du bot...")
+                logger.info(f"🚀 Démarrage du bot (shards {SHARD_IDS or 'tous'})..." if SHARD_COUNT > 1
+                            else "🚀 Démarrage du bot...")
                 async with bot:
                     await bot.start(TOKEN)
+                return  # Retour normal de start() : arrêt demandé (SIGTERM ou bot.close())
             except Exception as e:
                 logger.error(f"❌ Crash du bot : {e}")
+                # Les cogs sauvegardent leurs files en se déchargeant et les reprennent au rechargement
+                for name in list(bot.cogs):
+                    try:
+                        await bot.remove_cog(name)
+                    except Exception as unload_error:
+                        logger.error(f"❌ Erreur lors du déchargement du cog {name} : {unload_error}")
+                if SUPERVISED:
+                    raise SystemExit(1)  # Seul ce processus est relancé, les autres shards continuent
+                # Un client fermé le reste : sans remise à zéro, start() reviendrait aussitôt sans se connecter.
+                # setup_hook recharge ensuite les cogs, qui reprennent les files sauvegardées.
+                bot.clear()
                 logger.info("🔄 Redémarrage dans 5 secondes...")
                 await asyncio.sleep(5)
 
@@ -10,3 +10,118 @@ TOKEN = os.getenv('DISCORD_TOKEN')
 # Vérification du Token
 if not TOKEN:
     raise ValueError("❌ Le token Discord n'a pas été trouvé. Assurez-vous que le fichier .env contient DISCORD_TOKEN.")
+
+# Mode de lecture par défaut : "stream" (lecture directe depuis l'URL source) ou "download" (téléchargement MP3)
+PLAYBACK_MODE = os.getenv('PLAYBACK_MODE', 'stream')
+
+# Nombre d'extractions yt-dlp simultanées sur la machine (hors de la boucle d'événements ; partagé entre
+# les processus du superviseur), attribuées à tour de rôle entre serveurs
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '4'))
+
+# Délai maximal (en secondes) d'une extraction yt-dlp avant abandon
+EXTRACTION_TIMEOUT = float(os.getenv('EXTRACTION_TIMEOUT', '120'))
+
+# Délai (en secondes) après lequel un lecteur de serveur inactif est libéré
+PLAYER_IDLE_TIMEOUT = float(os.getenv('PLAYER_IDLE_TIMEOUT', '600'))
+
+# Nombre de pistes à préparer à l'avance pendant la lecture de la piste en cours
+PREFETCH_COUNT = int(os.getenv('PREFETCH_COUNT', '2'))
+
+# Espace disque maximal (en octets) occupé par les pistes pré-téléchargées d'un serveur (mode "download")
+PREFETCH_MAX_BYTES = int(os.getenv('PREFETCH_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# Marge (en secondes) avant expiration d'une URL de flux en dessous de laquelle on la résout à nouveau
+STREAM_URL_MARGIN = float(os.getenv('STREAM_URL_MARGIN', '300'))
+
+# Dossier et taille maximale (en octets) du cache audio sur disque (mode "download")
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', 'music')
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+
+# Cache mémoire des métadonnées yt-dlp : nombre maximal d'entrées et durée de vie par défaut (en secondes)
+METADATA_CACHE_SIZE = int(os.getenv('METADATA_CACHE_SIZE', '1000'))
+METADATA_CACHE_TTL = float(os.getenv('METADATA_CACHE_TTL', '3600'))
+
+# Playlists : nombre d'entrées lues par page d'extraction et nombre maximal de pistes ajoutées
+PLAYLIST_PAGE_SIZE = int(os.getenv('PLAYLIST_PAGE_SIZE', '50'))
+PLAYLIST_MAX_TRACKS = int(os.getenv('PLAYLIST_MAX_TRACKS', '500'))
+
+# Sauvegarde des files d'attente : fichier SQLite, intervalle d'écriture groupée et de compactage (en secondes)
+QUEUE_DB_FILE = os.getenv('QUEUE_DB_FILE', 'queue_backup.sqlite3')
+QUEUE_FLUSH_INTERVAL = float(os.getenv('QUEUE_FLUSH_INTERVAL', '5'))
+QUEUE_COMPACT_INTERVAL = float(os.getenv('QUEUE_COMPACT_INTERVAL', '300'))
+
+# Métriques au format Prometheus : adresse et port du serveur HTTP local (port 0 pour désactiver)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Surveillance de la boucle d'événements (désactivée par défaut) : seuil de blocage et intervalle d'échantillonnage
+WATCHDOG_ENABLED = os.getenv('WATCHDOG_ENABLED', '0') == '1'
+WATCHDOG_THRESHOLD = float(os.getenv('WATCHDOG_THRESHOLD', '0.25'))
+WATCHDOG_SAMPLE_INTERVAL = float(os.getenv('WATCHDOG_SAMPLE_INTERVAL', '0.01'))
+
+# Panneaux de contrôle : un par serveur, enregistrés dans ce fichier SQLite
+PANEL_DB_FILE = os.getenv('PANEL_DB_FILE', 'panels.sqlite3')
+
+# Panneaux en direct : intervalle minimal entre deux éditions d'un même message, débit global maximal
+# d'éditions (par seconde) et rafraîchissement périodique du temps écoulé (en secondes)
+PANEL_EDIT_INTERVAL = float(os.getenv('PANEL_EDIT_INTERVAL', '5'))
+PANEL_EDIT_RATE = float(os.getenv('PANEL_EDIT_RATE', '5'))
+PANEL_REFRESH_INTERVAL = float(os.getenv('PANEL_REFRESH_INTERVAL', '15'))
+
+# Messages sortants : rafale et période par route (salon ou interaction), débit global (messages par seconde),
+# taille maximale de la file et âge maximal d'une notification avant abandon (en secondes)
+OUTBOUND_ROUTE_BURST = int(os.getenv('OUTBOUND_ROUTE_BURST', '5'))
+OUTBOUND_ROUTE_PERIOD = float(os.getenv('OUTBOUND_ROUTE_PERIOD', '5'))
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '40'))
+OUTBOUND_MAX_PENDING = int(os.getenv('OUTBOUND_MAX_PENDING', '200'))
+OUTBOUND_MAX_AGE = float(os.getenv('OUTBOUND_MAX_AGE', '30'))
+
+# Erreurs : salon qui reçoit les résumés (0 pour désactiver) et intervalle entre deux résumés (en secondes)
+ERROR_CHANNEL_ID = int(os.getenv('ERROR_CHANNEL_ID', '0'))
+ERROR_DIGEST_INTERVAL = float(os.getenv('ERROR_DIGEST_INTERVAL', '60'))
+
+# Sharding : nombre total de shards (0 = pas de sharding) et nombre de processus lancés par sharding.py.
+# SHARD_IDS et SHARD_WORKER sont fournis par le superviseur à chaque processus, pas à renseigner à la main.
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+SHARD_PROCESSES = int(os.getenv('SHARD_PROCESSES', '2'))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()]
+SHARD_WORKER = int(os.getenv('SHARD_WORKER', '0'))
+SUPERVISED = 'SHARD_WORKER' in os.environ
+
+# Superviseur : délai avant de relancer un processus tombé, doublé à chaque crash rapproché jusqu'au maximum
+SHARD_RESTART_DELAY = float(os.getenv('SHARD_RESTART_DELAY', '5'))
+SHARD_RESTART_MAX_DELAY = float(os.getenv('SHARD_RESTART_MAX_DELAY', '300'))
+
+# Métadonnées partagées entre les processus (fichier SQLite, en plus du cache mémoire de chaque processus)
+METADATA_DB_FILE = os.getenv('METADATA_DB_FILE', 'metadata_cache.sqlite3')
+
+# Pipeline audio (1 pour l'activer) : enchaînement sans coupure, fondu et normalisation, au prix d'un décodage PCM et d'un
+# ré-encodage Opus par piste. Désactivé, les flux Opus sont transmis tels quels et seuls les serveurs dont le volume a été
+# modifié passent par le pipeline. Durée du fondu enchaîné (0 = sans fondu) et avance avec laquelle le décodeur de la
+# piste suivante est lancé (en secondes)
+AUDIO_PIPELINE = os.getenv('AUDIO_PIPELINE', '0') == '1'
+CROSSFADE_SECONDS = float(os.getenv('CROSSFADE_SECONDS', '0'))
+PIPELINE_WARMUP = float(os.getenv('PIPELINE_WARMUP', '15'))
+
+# Normalisation du volume : niveau visé (RMS en dBFS) et gain maximal appliqué à une piste trop faible (en dB)
+LOUDNESS_NORMALIZATION = os.getenv('LOUDNESS_NORMALIZATION', '1') == '1'
+LOUDNESS_TARGET = float(os.getenv('LOUDNESS_TARGET', '-18'))
+LOUDNESS_MAX_GAIN = float(os.getenv('LOUDNESS_MAX_GAIN', '6'))
+
+# Processus FFmpeg simultanés sur la machine (partagé entre les processus du superviseur) et délai après lequel
+# un FFmpeg bloqué, ou resté ouvert sans connexion vocale, est arrêté (en secondes)
+FFMPEG_MAX_PROCESSES = int(os.getenv('FFMPEG_MAX_PROCESSES', '64'))
+FFMPEG_STALL_TIMEOUT = float(os.getenv('FFMPEG_STALL_TIMEOUT', '30'))
+
+# Déconnexion automatique du vocal (en secondes) : rien à jouer, lecture en pause, ou plus personne dans le salon
+VOICE_IDLE_TIMEOUT = float(os.getenv('VOICE_IDLE_TIMEOUT', '300'))
+VOICE_PAUSE_TIMEOUT = float(os.getenv('VOICE_PAUSE_TIMEOUT', '1800'))
+VOICE_EMPTY_TIMEOUT = float(os.getenv('VOICE_EMPTY_TIMEOUT', '60'))
+
+# Index local des pistes jouées (fichier SQLite partagé entre les processus), utilisé par l'autocomplétion de /play,
+# et nombre de résultats gardés pour une recherche YouTube
+TRACK_INDEX_FILE = os.getenv('TRACK_INDEX_FILE', 'track_index.sqlite3')
+SEARCH_RESULTS = int(os.getenv('SEARCH_RESULTS', '5'))
+
+# Empreinte des commandes slash déjà synchronisées : la synchronisation n'a lieu au démarrage que si elles changent
+COMMAND_HASH_FILE = os.getenv('COMMAND_HASH_FILE', 'command_tree.hash')
@@ -2,10 +2,16 @@ import os
 import logging
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 import asyncio
+from config import PANEL_REFRESH_INTERVAL, SHARD_IDS
+from panel_store import PanelStore
+from edit_coalescer import EditCoalescer
+from sharding import owns_guild
 
-PANEL_DATA_FILE = "panel_data.txt"  # Fichier pour stocker les informations du panneau
+PANEL_DATA_FILE = "panel_data.txt"  # Ancien fichier (un seul panneau), migré vers PanelStore
+PANEL_IMAGE = "https://i.pinimg.com/originals/53/b6/d9/53b6d9653a81e060a4c91a2b6c548dfd.gif"
+PANEL_QUEUE_PREVIEW = 5  # Pistes à venir affichées sur le panneau
 
 # Configuration du logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]: %(message)s")
@@ -15,38 +21,182 @@ logger = logging.getLogger("ControlPanel")
 class ControlPanel(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.store = PanelStore()
+        self.panels = {}  # guild_id -> (channel_id, message_id)
+        self.updater = EditCoalescer(on_missing=self.forget_message)  # Éditions regroupées par message
+        self.rendered = {}  # guild_id -> état affiché lors de la dernière édition
 
-    async def create_panel(self, channel: discord.TextChannel):
-        """Créer un panneau interactif dans le canal spécifié."""
-        embed = discord.Embed(
-            title="🎵 Panneau de Contrôle du Bot Musical 🎵",
-            description="Utilisez les boutons ci-dessous pour contrôler la lecture.",
-            color=discord.Color.red()
-        )
-        embed.set_image(url="https://i.pinimg.com/originals/53/b6/d9/53b6d9653a81e060a4c91a2b6c548dfd.gif")
-        embed.set_footer(text="Bot Musical - Contrôlez votre musique avec style!")
+    async def cog_load(self):
+        """Enregistre la vue persistante : les boutons de tous les panneaux fonctionnent sans appel REST."""
+        self.bot.add_view(self.MusicControlView(self.bot))
+        panels = await asyncio.to_thread(self.store.load_all)
+        self.panels = {guild_id: panel for guild_id, panel in panels.items() if owns_guild(guild_id)}
+        self.rendered = dict.fromkeys(self.panels)  # Pas d'édition au démarrage : seuls les changements en déclenchent
+        logger.info(f"✅ {len(self.panels)} panneau(x) enregistré(s).")
+        self.refresh_panels.start()
+        if os.path.exists(PANEL_DATA_FILE):
+            asyncio.create_task(self.migrate_legacy_panel())
 
-        message = await channel.send(embed=embed, view=self.MusicControlView(self.bot))
-        with open(PANEL_DATA_FILE, "w") as f:
-            f.write(f"{channel.id}\n{message.id}")
-        logger.info(f"✅ Nouveau panneau créé dans le canal {channel.name}.")
+    async def cog_unload(self):
+        self.refresh_panels.cancel()
+        self.updater.close()
+        await asyncio.to_thread(self.store.close)
 
-    async def load_panel(self):
-        """Charge le panneau existant à partir des données enregistrées."""
+    async def migrate_legacy_panel(self):
+        """Reprend le panneau de l'ancien fichier panel_data.txt dans la base par serveur."""
+        await self.bot.wait_until_ready()
         try:
             with open(PANEL_DATA_FILE, "r") as f:
                 channel_id, message_id = map(int, f.readlines())
+        except (OSError, ValueError):
+            logger.warning("❌ Ancien fichier de panneau illisible, ignoré.")
+            return
 
-            channel = self.bot.get_channel(channel_id)
-            if not channel:
-                logger.warning("❌ Canal introuvable. Le panneau ne peut pas être chargé.")
+        channel = self.bot.get_channel(channel_id)
+        if channel is None and SHARD_IDS:
+            return  # Salon d'un autre processus : c'est lui qui reprendra le panneau
+        if channel and channel.guild.id not in self.panels:
+            # Les boutons de l'ancien message ont des custom_id aléatoires : on y met ceux de la vue persistante
+            player = self.get_player(channel.guild.id)
+            view = self.MusicControlView(self.bot, player)
+            try:
+                await channel.get_partial_message(message_id).edit(embed=self.build_embed(player), view=view)
+            except discord.NotFound:
+                logger.warning("❌ Ancien panneau introuvable, non migré.")
+                os.remove(PANEL_DATA_FILE)
                 return
+            finally:
+                view.stop()  # Les clics sont traités par la vue persistante
+            self.updater.mark_sent(message_id)
+            self.panels[channel.guild.id] = (channel_id, message_id)
+            self.rendered[channel.guild.id] = self.panel_state(player)
+            await asyncio.to_thread(self.store.save, channel.guild.id, channel_id, message_id)
+            logger.info(f"✅ Panneau de {channel.guild.name} migré depuis {PANEL_DATA_FILE}.")
+        os.remove(PANEL_DATA_FILE)
+
+    async def create_panel(self, channel: discord.TextChannel):
+        """Créer un panneau interactif dans le canal spécifié (remplace l'ancien panneau du serveur)."""
+        player = self.get_player(channel.guild.id)
+        view = self.MusicControlView(self.bot, player)
+        message = await channel.send(embed=self.build_embed(player), view=view)
+        view.stop()  # Les clics sont traités par la vue persistante
+        self.updater.mark_sent(message.id)
+        previous = self.panels.get(channel.guild.id)
+        self.panels[channel.guild.id] = (channel.id, message.id)
+        self.rendered[channel.guild.id] = self.panel_state(player)
+        await asyncio.to_thread(self.store.save, channel.guild.id, channel.id, message.id)
+        logger.info(f"✅ Nouveau panneau créé dans le canal {channel.name}.")
+
+        if previous:
+            self.updater.forget(previous[1])
+            old_channel = self.bot.get_channel(previous[0])
+            if old_channel:
+                try:
+                    await old_channel.get_partial_message(previous[1]).delete()
+                except discord.HTTPException:
+                    pass
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """Oublie le panneau d'un serveur si son message est supprimé."""
+        panel = self.panels.get(payload.guild_id)
+        if panel and panel[1] == payload.message_id:
+            self.updater.forget(payload.message_id)
+            await self.remove_panel(payload.guild_id)
 
-            message = await channel.fetch_message(message_id)
-            await message.edit(view=self.MusicControlView(self.bot))
-            logger.info(f"✅ Panneau rechargé dans le canal {channel.name}.")
-        except (FileNotFoundError, ValueError, discord.NotFound):
-            logger.warning("❌ Aucun panneau existant trouvé ou données invalides.")
+    async def remove_panel(self, guild_id: int):
+        del self.panels[guild_id]
+        self.rendered.pop(guild_id, None)
+        await asyncio.to_thread(self.store.delete, guild_id)
+        logger.info(f"🗑️ Panneau supprimé dans le serveur {guild_id}.")
+
+    def forget_message(self, message_id: int):
+        """Le message d'un panneau a disparu pendant une édition : on oublie ce panneau."""
+        for guild_id, (_, panel_message_id) in list(self.panels.items()):
+            if panel_message_id == message_id:
+                asyncio.create_task(self.remove_panel(guild_id))
+
+    def has_panel(self, guild_id: int) -> bool:
+        return guild_id in self.panels
+
+    def get_player(self, guild_id: int):
+        music_cog = self.bot.get_cog("MusicSlash")
+        return music_cog.players.peek(guild_id) if music_cog else None
+
+    @staticmethod
+    def panel_state(player):
+        """Résumé de ce qu'affiche le panneau, hors temps écoulé : sert à ignorer les rafraîchissements inutiles."""
+        if player is None or player.current is None:
+            return None
+        paused = player.is_connected() and player.voice_client.is_paused()
+        return (player.current, player.current.title, paused, player.queue.version, player.queue.fair)
+
+    @staticmethod
+    def format_duration(seconds: float) -> str:
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+    def build_embed(self, player) -> discord.Embed:
+        """Construit l'embed du panneau à partir de l'état actuel du lecteur."""
+        embed = discord.Embed(title="🎵 Panneau de Contrôle du Bot Musical 🎵", color=discord.Color.red())
+        if player is None or player.current is None:
+            embed.description = "Utilisez les boutons ci-dessous pour contrôler la lecture."
+            embed.set_image(url=PANEL_IMAGE)
+            embed.set_footer(text="Bot Musical - Contrôlez votre musique avec style!")
+            return embed
+
+        paused = player.is_connected() and player.voice_client.is_paused()
+        elapsed = self.format_duration(player.update_position())
+        if player.duration:
+            elapsed += f" / {self.format_duration(player.duration)}"
+        embed.add_field(
+            name="⏸ En pause" if paused else "🎶 En cours",
+            value=f"{player.current.label}\n`{elapsed}` — <@{player.current.requester_id}>",
+            inline=False
+        )
+        upcoming = player.queue.peek(PANEL_QUEUE_PREVIEW)
+        lines = [f"`{i + 1}.` {track.label}" for i, track in enumerate(upcoming)]
+        if len(player.queue) > len(upcoming):
+            lines.append(f"… et {len(player.queue) - len(upcoming)} autre(s)")
+        embed.add_field(name="À suivre", value="\n".join(lines) or "Aucune piste en attente.", inline=False)
+        mode = " • mode équitable" if player.queue.fair else ""
+        embed.set_footer(text=f"{len(player.queue)} piste(s) en attente{mode}")
+        return embed
+
+    def render_panel(self, guild_id: int):
+        """Appelé par le coalesceur au moment d'éditer : l'état le plus récent est affiché."""
+        if guild_id not in self.panels:
+            return None
+        player = self.get_player(guild_id)
+        self.rendered[guild_id] = self.panel_state(player)
+        return {'embed': self.build_embed(player), 'view': self.MusicControlView(self.bot, player)}
+
+    def refresh_panel(self, guild_id: int):
+        """Demande la mise à jour du panneau du serveur (regroupée avec les demandes proches)."""
+        panel = self.panels.get(guild_id)
+        channel = self.bot.get_channel(panel[0]) if panel else None
+        if channel is None:
+            return
+        self.updater.request(channel.get_partial_message(panel[1]), lambda: self.render_panel(guild_id))
+
+    @commands.Cog.listener()
+    async def on_player_update(self, guild_id: int):
+        """Changement d'état signalé par MusicSlash (nouvelle piste, arrêt, ajout...)."""
+        self.refresh_panel(guild_id)
+
+    @tasks.loop(seconds=PANEL_REFRESH_INTERVAL)
+    async def refresh_panels(self):
+        """Avance le temps écoulé des panneaux en lecture et rattrape les changements de file."""
+        for guild_id in list(self.panels):
+            player = self.get_player(guild_id)
+            playing = player is not None and player.is_connected() and player.voice_client.is_playing()
+            if playing or self.panel_state(player) != self.rendered.get(guild_id):
+                self.refresh_panel(guild_id)
+
+    @refresh_panels.before_loop
+    async def before_refresh_panels(self):
+        await self.bot.wait_until_ready()
 
     class PlayMusicModal(discord.ui.Modal):
         """Formulaire pour ajouter un lien de musique."""
@@ -54,59 +204,73 @@ class ControlPanel(commands.Cog):
             super().__init__(title="🎵 Ajouter une musique")
             self.bot = bot
             self.url_input = discord.ui.TextInput(
-                label="Lien YouTube",
-                placeholder="Entrez le lien YouTube ici...",
+                label="Lien YouTube ou recherche",
+                placeholder="Entrez un lien YouTube ou un titre...",
                 style=discord.TextStyle.short
             )
             self.add_item(self.url_input)
 
         async def on_submit(self, interaction: discord.Interaction):
             """Action après soumission du formulaire."""
-            url = self.url_input.value
+            query = self.url_input.value.strip()
             music_cog = self.bot.get_cog("MusicSlash")
 
-            if music_cog and music_cog.is_valid_url(url):
+            if music_cog and query:
                 await interaction.response.defer()
-                await music_cog.play_music_from_panel(interaction, url)
+                await music_cog.play_music_from_panel(interaction, query)
             else:
-                await interaction.response.send_message("❌ Lien invalide. Veuillez fournir un lien YouTube valide.", ephemeral=True)
+                await interaction.response.send_message("❌ Veuillez fournir un lien YouTube ou un titre.", ephemeral=True)
 
     class MusicControlView(discord.ui.View):
-        """Vue interactive pour les boutons de contrôle musical."""
-        def __init__(self, bot):
+        """Vue persistante : les custom_id fixes permettent à une seule instance de servir tous les panneaux."""
+        def __init__(self, bot, player=None):
             super().__init__(timeout=None)
             self.bot = bot
+            if player is not None and player.is_connected():
+                # Rendu seulement : les boutons sans effet sont grisés selon l'état de lecture
+                self.pause_button.disabled = not player.voice_client.is_playing()
+                self.reprendre_button.disabled = not player.voice_client.is_paused()
+
+        def update_position(self, guild_id: int):
+            music_cog = self.bot.get_cog("MusicSlash")
+            player = music_cog.players.peek(guild_id) if music_cog else None
+            if player:
+                player.update_position()
 
-        @discord.ui.button(label="▶️ Play", style=discord.ButtonStyle.green)
+        @discord.ui.button(label="▶️ Play", style=discord.ButtonStyle.green, custom_id="music:play")
         async def play_button(self, interaction: discord.Interaction, button: discord.ui.Button):
             """Ouvre un formulaire pour entrer un lien YouTube."""
             await interaction.response.send_modal(ControlPanel.PlayMusicModal(self.bot))
 
-        @discord.ui.button(label="⏸ Pause", style=discord.ButtonStyle.blurple)
+        @discord.ui.button(label="⏸ Pause", style=discord.ButtonStyle.blurple, custom_id="music:pause")
         async def pause_button(self, interaction: discord.Interaction, button: discord.ui.Button):
             if interaction.guild.voice_client and interaction.guild.voice_client.is_playing():
+                self.update_position(interaction.guild_id)  # Compte le temps lu jusqu'à la pause
                 interaction.guild.voice_client.pause()
+                self.bot.dispatch("player_update", interaction.guild_id)
                 await interaction.response.send_message("⏸ Musique mise en pause.", ephemeral=True)
             else:
                 await interaction.response.send_message("❌ Aucune musique en cours de lecture.", ephemeral=True)
 
-        @discord.ui.button(label="⏯️ Reprendre", style=discord.ButtonStyle.blurple)
+        @discord.ui.button(label="⏯️ Reprendre", style=discord.ButtonStyle.blurple, custom_id="music:resume")
         async def reprendre_button(self, interaction: discord.Interaction, button: discord.ui.Button):
             if interaction.guild.voice_client and interaction.guild.voice_client.is_paused():
+                self.update_position(interaction.guild_id)  # Le temps passé en pause n'est pas compté
                 interaction.guild.voice_client.resume()
+                self.bot.dispatch("player_update", interaction.guild_id)
                 await interaction.response.send_message("▶️ Musique reprise.", ephemeral=True)
             else:
                 await interaction.response.send_message("❌ Aucune musique en pause.", ephemeral=True)
 
-        @discord.ui.button(label="⏹ Stop", style=discord.ButtonStyle.red)
+        @discord.ui.button(label="⏹ Stop", style=discord.ButtonStyle.red, custom_id="music:stop")
         async def stop_button(self, interaction: discord.Interaction, button: discord.ui.Button):
             music_cog = self.bot.get_cog("MusicSlash")
             if music_cog:
-                await music_cog.stop(interaction)
+                await music_cog.stop_music(interaction)
             else:
                 await interaction.response.send_message("❌ Le cog MusicSlash n'est pas chargé.", ephemeral=True)
 
-        @discord.ui.button(label="⏭ Skip", style=discord.ButtonStyle.blurple)
+        @discord.ui.button(label="⏭ Skip", style=discord.ButtonStyle.blurple, custom_id="music:skip")
         async def skip_button(self, interaction: discord.Interaction, button: discord.ui.Button):
             """Passe à la musique suivante via le bouton Skip."""
             music_cog = self.bot.get_cog("MusicSlash")
@@ -116,36 +280,20 @@ class ControlPanel(commands.Cog):
                 await interaction.response.send_message("❌ Le cog MusicSlash n'est pas chargé ou incomplet.", ephemeral=True)
 
     @app_commands.command(name="setup", description="Configurer le panneau de contrôle dans un canal.")
-    async def setup(self, interaction: discord.Interaction):
-        """Configurer le panneau interactif dans un canal spécifique."""
-        await interaction.response.send_message(
-            "Veuillez mentionner le canal où le panneau doit être configuré (ex. : `#général`).", ephemeral=True
-        )
-
-        def check(msg: discord.Message):
-            return (
-                msg.author == interaction.user
-                and msg.channel == interaction.channel
-                and msg.content.startswith("<#")
-            )
-
-        try:
-            msg = await self.bot.wait_for("message", check=check, timeout=60)
-            channel_id = int(msg.content.strip("<>#"))
-            channel = self.bot.get_channel(channel_id)
-
-            if not channel or not isinstance(channel, discord.TextChannel):
-                await interaction.followup.send("❌ Le canal spécifié est invalide.", ephemeral=True)
-                return
-
-            await self.create_panel(channel)
-            await interaction.followup.send(f"✅ Panneau configuré dans le canal {channel.mention}.", ephemeral=True)
-        except asyncio.TimeoutError:
-            await interaction.followup.send("❌ Temps écoulé. Veuillez réessayer la commande `/setup`.", ephemeral=True)
+    async def setup(self, interaction: discord.Interaction, canal: discord.TextChannel):
+        """Configurer le panneau interactif dans le canal indiqué (remplace et supprime l'ancien panneau)."""
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ Vous n'avez pas les permissions requises.", ephemeral=True)
+            return
+        permissions = canal.permissions_for(interaction.guild.me)
+        if not (permissions.send_messages and permissions.embed_links):
+            await interaction.response.send_message("❌ Je ne peux pas envoyer le panneau dans ce canal.", ephemeral=True)
+            return
 
+        await interaction.response.defer(ephemeral=True)
+        await self.create_panel(canal)
+        await interaction.followup.send(f"✅ Panneau configuré dans le canal {canal.mention}.", ephemeral=True)
 
 async def setup(bot):
-    """Ajoute le cog ControlPanel au bot et recharge un panneau existant si nécessaire."""
-    control_panel = ControlPanel(bot)
-    await bot.add_cog(control_panel)
-    await control_panel.load_panel()
+    """Ajoute le cog ControlPanel au bot (la vue persistante est enregistrée au chargement du cog)."""
+    await bot.add_cog(ControlPanel(bot))
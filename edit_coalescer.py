@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+import discord
+from config import PANEL_EDIT_INTERVAL, PANEL_EDIT_RATE
+import metrics
+
+logger = logging.getLogger("EditCoalescer")
+
+PANEL_EDITS = metrics.counter("bot_panel_edits_total", "Demandes d'édition des panneaux (result=sent|coalesced|failed).")
+
+
+class EditCoalescer:
+    """Regroupe les demandes d'édition d'un même message : au plus une édition par fenêtre `interval`.
+
+    Le contenu est calculé au moment de l'envoi, à partir de l'état le plus récent : une rafale de
+    changements (skips, ajouts) ne produit qu'une seule édition. Un débit global borne en plus le
+    total des éditions, tous serveurs confondus.
+    """
+
+    def __init__(self, interval: float = PANEL_EDIT_INTERVAL, rate: float = PANEL_EDIT_RATE, on_missing=None):
+        self.interval = interval
+        self.spacing = 1 / rate if rate > 0 else 0.0
+        self.on_missing = on_missing  # Appelé avec l'identifiant d'un message supprimé entre-temps
+        self.pending = {}  # message_id -> (message partiel, fonction de rendu) en attente d'envoi
+        self.tasks = {}  # message_id -> tâche d'envoi
+        self.last_edit = {}  # message_id -> instant de la dernière édition
+        self._next_slot = 0.0  # Prochain créneau libre du débit global
+
+    def request(self, message: discord.PartialMessage, render):
+        """Demande l'édition de `message` ; `render()` retourne les arguments de `edit()` ou None."""
+        if message.id in self.pending:
+            PANEL_EDITS.inc(result="coalesced")
+        self.pending[message.id] = (message, render)
+        task = self.tasks.get(message.id)
+        if task is None or task.done():
+            self.tasks[message.id] = asyncio.create_task(self._flush(message.id))
+
+    def mark_sent(self, message_id: int):
+        """Signale un envoi fait hors du coalesceur (création du message) : la fenêtre repart de maintenant."""
+        self.last_edit[message_id] = time.monotonic()
+
+    def forget(self, message_id: int):
+        """Oublie un message (supprimé ou remplacé) et annule son édition en attente."""
+        self.pending.pop(message_id, None)
+        self.last_edit.pop(message_id, None)
+        task = self.tasks.pop(message_id, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _flush(self, message_id: int):
+        while message_id in self.pending:
+            now = time.monotonic()
+            ready_at = max(self.last_edit.get(message_id, 0.0) + self.interval, now)
+            slot = max(ready_at, self._next_slot)
+            self._next_slot = slot + self.spacing
+            if slot > now:
+                await asyncio.sleep(slot - now)
+
+            entry = self.pending.pop(message_id, None)
+            if entry is None:
+                continue
+            message, render = entry
+            self.last_edit[message_id] = time.monotonic()
+            kwargs = render()
+            if kwargs is None:
+                continue
+            try:
+                await message.edit(**kwargs)
+                PANEL_EDITS.inc(result="sent")
+            except discord.NotFound:
+                PANEL_EDITS.inc(result="failed")
+                self.forget(message_id)
+                if self.on_missing:
+                    self.on_missing(message_id)
+                return
+            except discord.HTTPException as e:
+                PANEL_EDITS.inc(result="failed")
+                logger.warning(f"⚠️ Édition du panneau {message_id} impossible : {e}")
+            finally:
+                view = kwargs.get('view')
+                if view is not None:
+                    view.stop()  # La vue persistante reçoit les clics ; celle-ci ne sert qu'au rendu
+        self.tasks.pop(message_id, None)
+
+    def stats(self) -> dict:
+        return {'pending': len(self.pending), 'tracked': len(self.last_edit)}
+
+    def close(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+        self.pending.clear()
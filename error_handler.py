@@ -1,13 +1,12 @@
-import discord
 import traceback
+import outbound
+from config import ERROR_CHANNEL_ID
 from logging_config import logger  # Assure-toi d'avoir configuré le logger
 
 async def report_error(bot, channel_id, error_message):
-    """Envoie une notification d'erreur dans un canal Discord."""
+    """Ajoute l'erreur au prochain résumé du canal (les erreurs répétées sont regroupées et comptées)."""
     try:
-        channel = bot.get_channel(channel_id)
-        if channel:
-            await channel.send(f"⚠️ **Erreur détectée :**\n```{error_message}```")
+        outbound.SCHEDULER.report_error(bot, channel_id, error_message)
     except Exception as e:
         logger.error(f"❌ Impossible d'envoyer l'erreur : {e}")
 
@@ -15,4 +14,5 @@ async def global_error_handler(bot, event, *args, **kwargs):
     """Capture toutes les erreurs globales."""
     error_message = traceback.format_exc()
     logger.error(error_message)
-    await report_error(bot, 123456789012345678, error_message)  # Remplace par l'ID du canal
+    if ERROR_CHANNEL_ID:
+        await report_error(bot, ERROR_CHANNEL_ID, error_message)
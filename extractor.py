@@ -0,0 +1,167 @@
+import asyncio
+import importlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
+from config import EXTRACTION_WORKERS, EXTRACTION_TIMEOUT
+from resource_governor import FairLimiter, host_share
+import metrics
+
+logger = logging.getLogger("Extraction")
+
+
+class ExtractionCancelled(Exception):
+    """L'extraction a été annulée (commande /stop ou /quitte)."""
+
+
+class ExtractionTimeout(Exception):
+    """L'extraction a dépassé le délai autorisé."""
+
+
+class ExtractionPool:
+    """Exécute tous les appels yt-dlp dans un pool de threads borné, hors de la boucle asyncio.
+
+    Les places du pool sont attribuées à tour de rôle entre serveurs : une longue playlist n'affame pas les autres.
+    """
+
+    def __init__(self, max_workers: int = host_share(EXTRACTION_WORKERS), timeout: float = EXTRACTION_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="yt-dlp")
+        self.limiter = FairLimiter(max_workers)
+        self.submitted = 0  # Extractions soumises et non terminées
+        self.running = 0  # Extractions en cours d'exécution dans un thread
+        self._lock = threading.Lock()
+        self._jobs = {}  # guild_id -> {cancel_event: asyncio.Future}
+
+        metrics.gauge("bot_extraction_queue_depth", "Extractions yt-dlp en attente d'un thread libre.",
+                      lambda: {(): self.queue_depth})
+        metrics.gauge("bot_extraction_running", "Extractions yt-dlp en cours.", lambda: {(): self.running})
+
+    @property
+    def queue_depth(self) -> int:
+        """Nombre d'extractions en attente d'un thread libre."""
+        return max(self.submitted - self.running, 0)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "guilds_waiting": len(self.limiter.rotation),
+        }
+
+    async def run(self, func, *args, guild_id=None, timeout: float = None):
+        """Exécute `func(cancel_event, *args)` dans le pool avec délai et annulation par serveur."""
+        loop = asyncio.get_running_loop()
+        cancel_event = threading.Event()
+        aborted = loop.create_future()
+
+        def job():
+            if cancel_event.is_set():
+                raise ExtractionCancelled()
+            with self._lock:
+                self.running += 1
+            try:
+                return func(cancel_event, *args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        self.submitted += 1
+        self._jobs.setdefault(guild_id, {})[cancel_event] = aborted
+        if self.submitted > self.max_workers:
+            # Une playlist en soumet des dizaines d'un coup : la jauge bot_extraction_queue_depth suit la file
+            logger.debug(f"⏳ File d'extraction : {self.queue_depth} en attente ({self.running}/{self.max_workers} actives).")
+
+        slot = asyncio.ensure_future(self.limiter.acquire(guild_id))
+        job_future = None
+        try:
+            done, _ = await asyncio.wait({slot, aborted}, return_when=asyncio.FIRST_COMPLETED)
+            if slot not in done:
+                raise ExtractionCancelled()
+            # Le délai ne compte qu'à partir de l'obtention d'une place. La place n'est rendue qu'à la fin
+            # réelle du travail : un thread dépassé continue de tourner, la place suivante attendrait derrière lui.
+            job_future = self.executor.submit(job)
+            job_future.add_done_callback(lambda _: self._release_slot(loop))
+            future = asyncio.wrap_future(job_future, loop=loop)
+            done, _ = await asyncio.wait({future, aborted}, timeout=timeout or self.timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            # Annulation d'abord : le thread arrêté par /stop peut avoir terminé (en erreur) avant le réveil
+            if aborted in done:
+                if future.done() and not future.cancelled():
+                    future.exception()  # Résultat abandonné, marqué comme lu
+                raise ExtractionCancelled()
+            if future in done:
+                return future.result()
+            cancel_event.set()
+            future.cancel()
+            raise ExtractionTimeout()
+        except BaseException:
+            # Le thread ne peut pas être interrompu : on lève le drapeau pour qu'il s'arrête au plus tôt
+            cancel_event.set()
+            raise
+        finally:
+            if not (slot.done() and not slot.cancelled()):
+                slot.cancel()
+            elif job_future is None:
+                self.limiter.release()  # Place obtenue mais travail jamais soumis
+            self.submitted -= 1
+            jobs = self._jobs.get(guild_id)
+            if jobs is not None:
+                jobs.pop(cancel_event, None)
+                if not jobs:
+                    del self._jobs[guild_id]
+
+    def _release_slot(self, loop):
+        """Rend la place d'un travail terminé (appelé depuis le thread qui l'a exécuté)."""
+        try:
+            loop.call_soon_threadsafe(self.limiter.release)
+        except RuntimeError:
+            pass  # Boucle déjà fermée (arrêt du bot)
+
+    async def extract(self, url: str, ydl_opts: dict, download: bool = False, guild_id=None, timeout: float = None,
+                      kind: str = None) -> dict:
+        """Appelle `YoutubeDL.extract_info` dans le pool ; `kind` étiquette la mesure de durée."""
+        kind = kind or ("download" if download else "metadata")
+        return await self.run(self._extract_info, url, ydl_opts, download, kind, guild_id=guild_id, timeout=timeout)
+
+    def warm_up(self):
+        """Importe yt-dlp dans un thread du pool : la première extraction ne paie pas son import."""
+        self.executor.submit(importlib.import_module, "yt_dlp")
+
+    @staticmethod
+    def _extract_info(cancel_event, url, ydl_opts, download, kind):
+        import yt_dlp  # Import lent : fait au premier usage, dans un thread du pool plutôt qu'au démarrage du bot
+
+        def check_cancelled(_):
+            if cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled("Extraction annulée")
+
+        opts = dict(ydl_opts)
+        opts['progress_hooks'] = list(opts.get('progress_hooks', [])) + [check_cancelled]
+        start = time.monotonic()
+        try:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                return ydl.extract_info(url, download=download)
+        except yt_dlp.utils.DownloadCancelled:
+            raise ExtractionCancelled() from None
+        finally:
+            metrics.EXTRACTION_SECONDS.observe(time.monotonic() - start, kind=kind)
+
+    def cancel_guild(self, guild_id):
+        """Annule toutes les extractions en cours ou en attente pour un serveur."""
+        jobs = self._jobs.get(guild_id, {})
+        for cancel_event, aborted in list(jobs.items()):
+            cancel_event.set()
+            if not aborted.done():
+                aborted.set_result(None)
+        if jobs:
+            logger.info(f"🛑 {len(jobs)} extraction(s) annulée(s) pour le serveur {guild_id}.")
+
+    def shutdown(self):
+        for jobs in self._jobs.values():
+            for cancel_event in jobs:
+                cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from config import PLAYER_IDLE_TIMEOUT
+from track_queue import TrackQueue
+
+logger = logging.getLogger("GuildPlayer")
+
+
+class GuildPlayer:
+    """État de lecture propre à un serveur : file d'attente, client vocal et tâche de lecture."""
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.queue = TrackQueue()  # File d'attente des musiques du serveur
+        self.current = None  # Piste en cours de lecture
+        self.position = 0.0  # Secondes déjà lues de la piste en cours
+        self.duration = None  # Durée de la piste en cours (si connue)
+        self._position_tick = None
+        self.voice_client = None  # Client vocal du serveur
+        self.volume = 1.0  # Volume du serveur (1.0 = 100 %), appliqué par le pipeline audio
+        self.pipeline = None  # Source audio qui enchaîne les pistes (AudioPipeline), tant qu'elle joue
+        self.arm_task = None  # Tâche qui prépare la piste suivante dans le pipeline
+        self.arm_entry = None  # Piste de la file en cours de préparation (ou déjà armée)
+        self.is_playing = False
+        self.task = None  # Tâche asyncio qui prépare et lance la piste suivante
+        self.prefetched = {}  # url -> tâche de résolution anticipée des pistes à venir
+        self.playlist_task = None  # Tâche qui parcourt une playlist page par page
+        self.lock = asyncio.Lock()  # Sérialise les transitions de piste
+        self.last_active = time.monotonic()
+        self.alone_since = None  # Instant depuis lequel le bot est seul dans son salon vocal
+
+    def touch(self):
+        """Marque le lecteur comme actif."""
+        self.last_active = time.monotonic()
+
+    def start_track(self, offset: float = 0.0, duration: float = None):
+        """Remet le compteur de position à zéro (ou à `offset`) au début d'une piste."""
+        self.position = offset
+        self.duration = duration
+        self._position_tick = time.monotonic()
+
+    def update_position(self) -> float:
+        """Avance la position du temps écoulé depuis le dernier appel, sauf si la lecture est en pause."""
+        now = time.monotonic()
+        if self._position_tick is not None and self.is_connected() and self.voice_client.is_playing():
+            self.position += now - self._position_tick
+        self._position_tick = now
+        return self.position
+
+    def is_connected(self) -> bool:
+        return self.voice_client is not None and self.voice_client.is_connected()
+
+    def is_idle(self, timeout: float) -> bool:
+        """Un lecteur est inactif s'il ne joue rien, n'a plus de file et n'a pas servi depuis `timeout`.
+
+        Un lecteur encore connecté n'est jamais libéré ici : la déconnexion automatique s'en charge.
+        """
+        if self.is_playing or self.queue or (self.task and not self.task.done()) or self.is_loading():
+            return False
+        if self.is_connected():
+            return False
+        return time.monotonic() - self.last_active > timeout
+
+    def is_loading(self) -> bool:
+        return self.playlist_task is not None and not self.playlist_task.done()
+
+    def cancel_prefetch(self):
+        """Abandonne toutes les résolutions anticipées."""
+        for task in self.prefetched.values():
+            task.cancel()
+        self.prefetched.clear()
+
+    def disarm(self):
+        """Annule la préparation de la piste suivante et la retire du pipeline."""
+        if self.arm_task and not self.arm_task.done():
+            self.arm_task.cancel()
+        self.arm_task = None
+        self.arm_entry = None
+        if self.pipeline:
+            self.pipeline.set_next(None)
+
+    def reset(self):
+        """Vide la file et oublie l'état de lecture."""
+        self.queue.clear()
+        self.cancel_prefetch()
+        self.is_playing = False
+        self.current = None
+        self.position = 0.0
+        self.duration = None
+        self._position_tick = None
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.task = None
+        self.disarm()
+        self.pipeline = None
+        if self.is_loading():
+            self.playlist_task.cancel()
+        self.playlist_task = None
+
+
+class PlayerManager:
+    """Crée les lecteurs à la demande (un par serveur) et libère ceux qui sont inactifs."""
+
+    def __init__(self, idle_timeout: float = PLAYER_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.players = {}  # guild_id -> GuildPlayer
+
+    def get(self, guild_id: int) -> GuildPlayer:
+        """Retourne le lecteur du serveur, en le créant si nécessaire."""
+        player = self.players.get(guild_id)
+        if player is None:
+            player = self.players[guild_id] = GuildPlayer(guild_id)
+            logger.info(f"🆕 Lecteur créé pour le serveur {guild_id}.")
+        player.touch()
+        return player
+
+    def peek(self, guild_id: int):
+        """Retourne le lecteur du serveur sans le créer."""
+        return self.players.get(guild_id)
+
+    def remove(self, guild_id: int):
+        player = self.players.pop(guild_id, None)
+        if player:
+            player.reset()
+        return player
+
+    def evict_idle(self) -> int:
+        """Libère les lecteurs inactifs et retourne leur nombre."""
+        idle = [guild_id for guild_id, player in self.players.items() if player.is_idle(self.idle_timeout)]
+        for guild_id in idle:
+            self.remove(guild_id)
+        if idle:
+            logger.info(f"🧹 {len(idle)} lecteur(s) inactif(s) libéré(s).")
+        return len(idle)
+
+    def __len__(self):
+        return len(self.players)
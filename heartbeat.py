@@ -1,15 +1,27 @@
 import time
-import threading
 import asyncio
+import metrics
+from logging_config import logger
+
+HEARTBEAT = metrics.gauge("bot_heartbeat_timestamp_seconds", "Horodatage du dernier heartbeat du bot.")
+UPTIME = metrics.gauge("bot_uptime_seconds", "Temps écoulé depuis le démarrage du processus.")
+
+_started_at = time.monotonic()
+_task = None
+
+def heartbeat(bot, interval=300):
+    """Met à jour les métriques de vie du bot toutes les X minutes (au lieu de poster dans un salon)."""
+    global _task
 
-def heartbeat(bot, channel_id):
-    """Envoie un ping toutes les X minutes pour montrer que le bot fonctionne."""
     async def send_heartbeat():
         while True:
-            channel = bot.get_channel(channel_id)
-            if channel:
-                await channel.send("✅ **Heartbeat :** Le bot est toujours en ligne.")
-            await asyncio.sleep(300)  # 5 minutes
+            HEARTBEAT.set(time.time())
+            UPTIME.set(round(time.monotonic() - _started_at))
+            logger.info(f"💓 Heartbeat : latence {round(bot.latency * 1000)} ms, "
+                        f"retard de la boucle {metrics.LOOP_LAG_CURRENT.read().get((), 0) * 1000:.1f} ms")
+            await asyncio.sleep(interval)
 
-    # Exécute la tâche de manière asynchrone
-    asyncio.run_coroutine_threadsafe(send_heartbeat(), bot.loop)
+    # Une seule tâche par processus, même si le bot redémarre
+    if _task is None or _task.done():
+        _task = asyncio.create_task(send_heartbeat())
+    return _task
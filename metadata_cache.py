@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import METADATA_CACHE_SIZE, METADATA_CACHE_TTL
+
+logger = logging.getLogger("MetadataCache")
+
+
+class MetadataStore:
+    """Copie sur disque (SQLite) des métadonnées, partagée par tous les processus du bot sur la machine."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()  # Appelé via asyncio.to_thread
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")  # Lectures concurrentes des autres processus
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self.db.execute("DELETE FROM metadata WHERE expires_at <= ?", (time.time(),))
+        self.db.commit()
+
+    def load(self, key):
+        """Retourne (expiration, valeur) si la clé existe et n'a pas expiré, sinon None."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT expires_at, value FROM metadata WHERE key = ? AND expires_at > ?", (json.dumps(key), time.time())
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def save(self, key, value, expires_at: float):
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO metadata (key, expires_at, value) VALUES (?, ?, ?)",
+                (json.dumps(key), expires_at, json.dumps(value)),
+            )
+
+    def delete(self, key):
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM metadata WHERE key = ?", (json.dumps(key),))
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+class MetadataCache:
+    """Cache mémoire à durée de vie limitée, avec fusion des requêtes simultanées sur une même clé."""
+
+    def __init__(self, max_entries: int = METADATA_CACHE_SIZE, default_ttl: float = METADATA_CACHE_TTL, path: str = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.store = MetadataStore(path) if path else None  # Second niveau, partagé entre processus
+        self.entries = OrderedDict()  # clé -> (expiration, valeur), du moins au plus récemment utilisé
+        self.inflight = {}  # clé -> tâche de récupération en cours
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Requêtes servies par une récupération déjà en cours
+        self.shared_hits = 0  # Échecs mémoire servis par la copie sur disque (résolus par un autre processus)
+
+    def get(self, key):
+        """Retourne la valeur en cache si elle n'a pas expiré."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, expires_at: float = None) -> float:
+        """Ajoute une valeur ; sans expiration fournie, la durée de vie par défaut s'applique."""
+        if expires_at is None:
+            expires_at = time.time() + self.default_ttl
+        if expires_at <= time.time():
+            return None
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return expires_at
+
+    async def invalidate(self, key):
+        """Oublie une valeur, en mémoire et dans la copie partagée sur disque."""
+        self.entries.pop(key, None)
+        if self.store:
+            await asyncio.to_thread(self.store.delete, key)
+
+    async def get_or_fetch(self, key, fetch, expires_at=None, store: bool = True, retry_on: tuple = ()):
+        """
+        Retourne la valeur en cache ou appelle `fetch()` une seule fois pour tous les demandeurs simultanés.
+
+        `expires_at(valeur)` donne l'expiration propre à la valeur. Les demandeurs qui attendaient la
+        récupération d'un autre la relancent eux-mêmes si elle échoue avec une exception de `retry_on`.
+        """
+        while True:
+            value = self.get(key) if store else None
+            if value is not None:
+                self.hits += 1
+                return value
+
+            task = self.inflight.get(key)
+            owner = task is None
+            if owner:
+                self.misses += 1
+                task = asyncio.ensure_future(self._fetch(key, fetch, expires_at, store))
+                self.inflight[key] = task
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            else:
+                self.coalesced += 1
+
+            try:
+                return await asyncio.shield(task)
+            except retry_on:
+                if owner:
+                    raise
+                logger.info(f"🔁 Récupération partagée interrompue, nouvelle tentative pour {key}.")
+
+    async def _fetch(self, key, fetch, expires_at, store):
+        try:
+            if store and self.store:
+                try:
+                    shared = await asyncio.to_thread(self.store.load, key)
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Lecture des métadonnées partagées impossible : {e}")
+                    shared = None
+                if shared is not None:
+                    self.shared_hits += 1
+                    self.put(key, shared[1], shared[0])
+                    return shared[1]
+
+            value = await fetch()
+            if store:
+                expiry = self.put(key, value, expires_at(value) if expires_at else None)
+                if expiry and self.store:
+                    try:
+                        await asyncio.to_thread(self.store.save, key, value, expiry)
+                    except (sqlite3.Error, TypeError, ValueError) as e:
+                        logger.warning(f"⚠️ Écriture des métadonnées partagées impossible : {e}")
+            return value
+        finally:
+            self.inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self.inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "shared_hits": self.shared_hits,
+        }
+
+    def close(self):
+        if self.store:
+            self.store.close()
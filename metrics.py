@@ -0,0 +1,238 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+import discord
+from config import METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger("Metrics")
+
+# Seuils (en secondes) des histogrammes de latence : mémoire fixe quel que soit le nombre de mesures
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    """Compteur croissant, éventuellement par étiquettes."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self) -> list:
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge:
+    """Valeur instantanée ; `callback` (facultatif) renvoie {étiquettes: valeur} au moment de la lecture."""
+
+    def __init__(self, name: str, help_text: str, callback=None, kind: str = "gauge"):
+        self.kind = kind  # "counter" pour exposer un compteur tenu ailleurs (ex. statistiques d'un cache)
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.values = {}
+
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def read(self) -> dict:
+        if self.callback is None:
+            return dict(self.values)
+        try:
+            return {tuple(sorted(labels)): value for labels, value in self.callback().items()}
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture de la jauge {self.name} impossible : {e}")
+            return {}
+
+    def collect(self) -> list:
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.read().items()]
+
+
+class Histogram:
+    """Histogramme à seuils fixes : seuls les compteurs par seuil sont gardés, pas les mesures."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # étiquettes -> [compteurs par seuil (+Inf inclus), somme, nombre]
+        self._lock = threading.Lock()  # Les mesures peuvent venir des threads audio et d'extraction
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def quantile(self, q: float, **labels):
+        """Estime un quantile à partir des seuils (borne supérieure du seuil atteint), None sans mesure."""
+        with self._lock:
+            series = self.series.get(tuple(sorted(labels.items())))
+            if not series or not series[2]:
+                return None
+            target = q * series[2]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[0]):
+                cumulative += count
+                if cumulative >= target:
+                    return bound
+        return None
+
+    def count(self, **labels) -> int:
+        series = self.series.get(tuple(sorted(labels.items())))
+        return series[2] if series else 0
+
+    def collect(self) -> list:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self.series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """Ensemble des métriques exposées, rendu au format texte Prometheus."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        # Un cog rechargé ré-enregistre ses jauges : la nouvelle version remplace l'ancienne
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str) -> Counter:
+    return REGISTRY.register(Counter(name, help_text))
+
+
+def gauge(name: str, help_text: str, callback=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_text, callback))
+
+
+def counter_callback(name: str, help_text: str, callback) -> Gauge:
+    """Compteur lu à la demande depuis un objet qui tient déjà ses propres totaux."""
+    return REGISTRY.register(Gauge(name, help_text, callback, kind="counter"))
+
+
+def histogram(name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, buckets))
+
+
+# Métriques partagées par les modules du bot
+EXTRACTION_SECONDS = histogram("bot_extraction_seconds", "Durée des extractions yt-dlp (kind=metadata|download|playlist).")
+QUEUE_WAIT_SECONDS = histogram("bot_queue_wait_seconds", "Temps passé par une piste dans la file avant sa préparation.")
+START_LATENCY_SECONDS = histogram("bot_track_start_seconds", "Temps entre la sortie de file et le premier paquet audio.")
+TIME_TO_FIRST_AUDIO_SECONDS = histogram("bot_time_to_first_audio_seconds", "Temps entre /play et le premier paquet audio.")
+LOOP_LAG_SECONDS = histogram("bot_event_loop_lag_seconds", "Retard de la boucle d'événements asyncio.",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+LOOP_LAG_CURRENT = gauge("bot_event_loop_lag_current_seconds", "Dernier retard mesuré de la boucle d'événements.")
+TRACKS_PLAYED = counter("bot_tracks_played_total", "Pistes dont la lecture a commencé (mode=stream|download).")
+
+
+class TimedAudioSource(discord.AudioSource):
+    """Enveloppe une source audio pour mesurer l'arrivée du premier paquet envoyé à Discord."""
+
+    def __init__(self, source: discord.AudioSource, on_first_packet):
+        self.source = source
+        self.on_first_packet = on_first_packet
+
+    def read(self) -> bytes:
+        data = self.source.read()
+        if self.on_first_packet is not None:
+            callback, self.on_first_packet = self.on_first_packet, None
+            callback(time.monotonic())
+        return data
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+async def monitor_loop_lag(interval: float = 1.0):
+    """Mesure en continu le retard de la boucle d'événements (réveil en retard sur `interval`)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - start - interval, 0.0)
+        LOOP_LAG_SECONDS.observe(lag)
+        LOOP_LAG_CURRENT.set(lag)
+
+
+async def _handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line.split()[1].decode() if len(request_line.split()) > 1 else "/"
+        if path.split("?")[0] == "/metrics":
+            status, body = "200 OK", REGISTRY.render().encode()
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+_server = None
+_lag_task = None
+
+
+async def start(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Démarre (une seule fois par processus) le serveur /metrics et la mesure du retard de la boucle."""
+    global _server, _lag_task
+    if _lag_task is None or _lag_task.done():
+        _lag_task = asyncio.create_task(monitor_loop_lag())
+    if _server is None and port:
+        try:
+            _server = await asyncio.start_server(_handle_request, host, port)
+            logger.info(f"📊 Métriques disponibles sur http://{host}:{port}/metrics")
+        except OSError as e:
+            logger.error(f"❌ Impossible de démarrer le serveur de métriques : {e}")
@@ -2,143 +2,866 @@ import os
 import logging
 import discord
 from discord import app_commands
-from discord.ext import commands
-import yt_dlp
+from discord.ext import commands, tasks
 import asyncio
+import re
+import time
+from urllib.parse import urlparse, parse_qs
+from config import PLAYBACK_MODE, PREFETCH_COUNT, PREFETCH_MAX_BYTES, STREAM_URL_MARGIN
+from config import PLAYLIST_PAGE_SIZE, PLAYLIST_MAX_TRACKS, QUEUE_FLUSH_INTERVAL, QUEUE_COMPACT_INTERVAL
+from config import METADATA_DB_FILE, AUDIO_PIPELINE, PIPELINE_WARMUP, LOUDNESS_NORMALIZATION
+from config import VOICE_IDLE_TIMEOUT, VOICE_PAUSE_TIMEOUT, VOICE_EMPTY_TIMEOUT, SEARCH_RESULTS
+from extractor import ExtractionPool, ExtractionCancelled, ExtractionTimeout
+from guild_player import PlayerManager
+from audio_cache import AudioCache
+from metadata_cache import MetadataCache
+from track_queue import Track
+from queue_handler import QueueStore
+from sharding import owns_guild
+from audio_pipeline import AudioPipeline, TrackSource, gain_for
+from resource_governor import ResourceGovernor
+from track_index import TrackIndex
+import metrics
+import outbound
 
 # Configuration du logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]: %(message)s")
 logger = logging.getLogger("MusicSlash")
 
+QUEUE_PAGE_SIZE = 10  # Pistes affichées par page de /queue
+
+PLAYBACK_MODES = ("stream", "download")
+
+YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com")  # Avec leurs sous-domaines : www., m., music.
+VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+# Options FFmpeg pour la lecture directe : reconnexion automatique si le flux coupe
+FFMPEG_STREAM_OPTIONS = {
+    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -nostdin',
+    'options': '-vn',
+}
+
+# Mode "stream" : on résout seulement l'URL directe du flux audio, sans téléchargement
+YDL_STREAM_OPTS = {
+    'format': 'bestaudio[acodec=opus]/bestaudio/best',
+    'noplaylist': True,
+    'quiet': True,
+}
+
+# Playlists : extraction "à plat" (identifiants et titres seulement), page par page
+YDL_FLAT_OPTS = {
+    'extract_flat': 'in_playlist',
+    'skip_download': True,
+    'quiet': True,
+}
+
+# Recherche libre : résultats "à plat" (identifiant, titre, durée), sans résoudre les flux
+YDL_SEARCH_OPTS = {
+    'extract_flat': True,
+    'skip_download': True,
+    'quiet': True,
+}
+
+# Mode "download" : téléchargement puis conversion en MP3 (ancien comportement, gardé en secours).
+# Le fichier est écrit dans le dossier temporaire du cache puis déplacé une fois complet.
+YDL_DOWNLOAD_OPTS = {
+    'format': 'bestaudio/best',
+    'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '192'}],
+    'noplaylist': True,
+    'quiet': True,
+}
+
 
 class MusicSlash(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.queue = []  # File d'attente des musiques
-        self.voice_client = None  # Référence au client vocal actuel
-        self.is_playing = False
-
-        if not os.path.exists("music"):
-            os.makedirs("music")
-
-    def cleanup_audio_files(self):
-        """Supprime les fichiers audio téléchargés."""
-        folder = "music"
-        for file in os.listdir(folder):
-            file_path = os.path.join(folder, file)
+        self.players = PlayerManager()  # Un lecteur (file, client vocal, tâche) par serveur
+        self.playback_modes = {}  # Mode de lecture choisi par serveur (guild_id -> mode)
+        self.extractor = ExtractionPool()  # Toutes les extractions yt-dlp passent par ce pool
+        self.governor = ResourceGovernor()  # Limite et surveille les processus FFmpeg
+        self.cache = AudioCache()  # Fichiers téléchargés, indexés par identifiant de vidéo
+        self.metadata = MetadataCache(path=METADATA_DB_FILE)  # Métadonnées et URL de flux, partagées entre processus
+        self.store = QueueStore()  # Files d'attente sauvegardées, reprises après un crash
+        self.index = TrackIndex()  # Pistes déjà jouées, pour l'autocomplétion de /play
+        self.saved_state = {}  # guild_id -> (version de la file, piste en cours, position) déjà sauvegardés
+        self.register_metrics()
+
+    def register_metrics(self):
+        """Expose l'état des lecteurs et des caches, lu à chaque collecte."""
+        metrics.gauge("bot_voice_connections", "Connexion vocale active (1) par serveur.", lambda: {
+            (("guild_id", guild_id),): 1 for guild_id, player in self.players.players.items() if player.is_connected()
+        })
+        metrics.gauge("bot_queue_length", "Pistes en attente par serveur.", lambda: {
+            (("guild_id", guild_id),): len(player.queue) for guild_id, player in self.players.players.items()
+        })
+        metrics.gauge("bot_players", "Lecteurs de serveur en mémoire.", lambda: {(): len(self.players)})
+        metrics.counter_callback("bot_cache_lookups_total", "Consultations des caches (cache=audio|metadata).", lambda: {
+            (("cache", "audio"), ("result", "hit")): self.cache.hits,
+            (("cache", "audio"), ("result", "miss")): self.cache.misses,
+            (("cache", "metadata"), ("result", "hit")): self.metadata.hits,
+            (("cache", "metadata"), ("result", "miss")): self.metadata.misses,
+            (("cache", "metadata"), ("result", "coalesced")): self.metadata.coalesced,
+            (("cache", "metadata"), ("result", "shared")): self.metadata.shared_hits,
+        })
+        metrics.counter_callback("bot_audio_cache_bytes_saved_total", "Octets non re-téléchargés grâce au cache audio.",
+                                 lambda: {(): self.cache.bytes_saved})
+        metrics.gauge("bot_audio_cache_bytes", "Taille du cache audio sur disque.", lambda: {(): self.cache.total_bytes})
+
+    async def cog_load(self):
+        self.evict_idle_players.start()
+        self.reap_idle_voice.start()
+        self.flush_queues.start()
+        self.compact_queues.start()
+        asyncio.create_task(self.restore_players())
+
+    async def cog_unload(self):
+        self.evict_idle_players.cancel()
+        self.reap_idle_voice.cancel()
+        self.flush_queues.cancel()
+        self.compact_queues.cancel()
+        # Dernière sauvegarde sans suppression : les lecteurs sont peut-être déjà déconnectés par l'arrêt
+        snapshots, _ = self.snapshot_players(final=True)
+        await asyncio.to_thread(self.store.write, snapshots)
+        self.store.close()
+        self.extractor.shutdown()
+        self.governor.shutdown()
+        await asyncio.to_thread(self.cache.close)
+        self.metadata.close()
+        self.index.close()
+
+    @tasks.loop(seconds=60)
+    async def evict_idle_players(self):
+        """Libère régulièrement les lecteurs des serveurs inactifs."""
+        self.players.evict_idle()
+
+    @tasks.loop(seconds=15)
+    async def reap_idle_voice(self):
+        """Quitte les salons vocaux vides ou inactifs, puis récupère les FFmpeg bloqués ou abandonnés."""
+        now = time.monotonic()
+        for player in list(self.players.players.values()):
+            reason = self.idle_reason(player, now) if player.is_connected() else None
+            if reason is None:
+                continue
+            logger.info(f"💤 Déconnexion du vocal (serveur {player.guild_id}) : {reason}.")
+            try:
+                await player.voice_client.disconnect()
+            except Exception as e:
+                logger.warning(f"⚠️ Déconnexion impossible (serveur {player.guild_id}) : {e}")
+        await self.governor.reap(self.is_guild_active)
+
+    @staticmethod
+    def idle_reason(player, now: float):
+        """Raison de quitter le salon vocal, ou None si le bot doit y rester."""
+        voice_client = player.voice_client
+        members = getattr(voice_client.channel, 'members', None)
+        if members is not None and not any(not member.bot for member in members):
+            if player.alone_since is None:
+                player.alone_since = now
+            elif now - player.alone_since > VOICE_EMPTY_TIMEOUT:
+                return "plus personne dans le salon"
+        else:
+            player.alone_since = None
+
+        if voice_client.is_playing() or player.is_loading() or (player.task and not player.task.done()):
+            player.touch()
+            return None
+        paused = voice_client.is_paused()
+        if now - player.last_active > (VOICE_PAUSE_TIMEOUT if paused else VOICE_IDLE_TIMEOUT):
+            return "lecture en pause trop longtemps" if paused else "inactif"
+        return None
+
+    def is_guild_active(self, guild_id) -> bool:
+        player = self.players.peek(guild_id)
+        return player is not None and player.is_connected()
+
+    def voice_connections(self) -> int:
+        return sum(1 for player in self.players.players.values() if player.is_connected())
+
+    def snapshot_players(self, final: bool = False):
+        """Prépare les instantanés des files modifiées depuis la dernière sauvegarde."""
+        snapshots = []
+        active = set()
+        for guild_id, player in self.players.players.items():
+            if player.voice_client is None or (player.current is None and not player.queue):
+                continue
+            active.add(guild_id)
+            position = round(player.update_position(), 1)
+            state = (player.queue.version, player.current, position)
+            previous = self.saved_state.get(guild_id)
+            if previous == state:
+                continue
+            queue_changed = previous is None or previous[:2] != state[:2]
+            tracks = []
+            if queue_changed:
+                tracks = ([player.current.to_row()] if player.current else []) + [t.to_row() for t in player.queue]
+            snapshots.append({
+                'guild_id': guild_id,
+                'voice_channel_id': player.voice_client.channel.id,
+                'fair': player.queue.fair,
+                'has_current': player.current is not None,
+                'position': position,
+                'tracks': tracks,
+                'queue_changed': queue_changed,
+            })
+            self.saved_state[guild_id] = state
+
+        removed = [] if final else [guild_id for guild_id in self.saved_state if guild_id not in active]
+        for guild_id in removed:
+            del self.saved_state[guild_id]
+        return snapshots, removed
+
+    @tasks.loop(seconds=QUEUE_FLUSH_INTERVAL)
+    async def flush_queues(self):
+        """Sauvegarde groupée des files modifiées, hors de la boucle asyncio."""
+        snapshots, removed = self.snapshot_players()
+        if snapshots or removed:
+            try:
+                await asyncio.to_thread(self.store.write, snapshots, removed)
+            except Exception as e:
+                logger.error(f"❌ Erreur lors de la sauvegarde des files d'attente : {e}")
+                self.saved_state.clear()  # Tout sera réécrit à la prochaine passe
+
+    @tasks.loop(seconds=QUEUE_COMPACT_INTERVAL)
+    async def compact_queues(self):
+        await asyncio.to_thread(self.store.compact)
+
+    async def restore_players(self):
+        """Reprend la lecture dans chaque serveur à la piste et à la position sauvegardées."""
+        await self.bot.wait_until_ready()
+        for state in await asyncio.to_thread(self.store.load_all):
+            guild_id = state['guild_id']
+            if not owns_guild(guild_id):
+                continue  # Serveur d'un autre processus : sa sauvegarde ne nous appartient pas
+            guild = self.bot.get_guild(guild_id)
+            channel = guild.get_channel(state['voice_channel_id']) if guild and state['voice_channel_id'] else None
+            tracks = [Track(*row) for row in state['tracks']]
+            if channel is None or not tracks:
+                self.saved_state[guild_id] = None  # Sera supprimé à la prochaine sauvegarde
+                continue
+            if state['has_current']:
+                tracks[0].start_at = state['position']
+
+            player = self.players.get(guild_id)
+            player.queue.fair = state['fair']
+            player.queue.extend(tracks)
             try:
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
-                    logger.info(f"✅ Fichier supprimé : {file_path}")
+                player.voice_client = guild.voice_client or await channel.connect()
             except Exception as e:
-                logger.error(f"❌ Erreur lors de la suppression de {file_path}: {e}")
+                logger.error(f"❌ Impossible de rejoindre {channel.name} pour reprendre la lecture : {e}")
+                self.players.remove(guild_id)
+                self.saved_state[guild_id] = None
+                continue
+
+            player.is_playing = True
+            self.schedule_next(player)
+            logger.info(f"🔄 Reprise de {len(tracks)} piste(s) dans le serveur {guild_id}.")
+            self.notify(tracks[0].channel_id, "🔄 Reprise de la lecture après redémarrage.")
 
     @staticmethod
     def is_valid_url(url: str) -> bool:
-        """Vérifie si l'URL est valide."""
-        from urllib.parse import urlparse
-        parsed = urlparse(url)
-        return parsed.scheme in ("http", "https") and "youtube.com" in parsed.netloc
-
-    async def play_next(self):
-        """Lit la musique suivante dans la file d'attente."""
-        if self.queue:
-            url, interaction = self.queue.pop(0)
+        """Vérifie si l'URL est un lien YouTube (vidéo ou playlist) reconnu."""
+        return MusicSlash.normalize_url(url) is not None
+
+    @staticmethod
+    def normalize_url(url: str):
+        """Ramène un lien YouTube (youtu.be, m., music., shorts, embed...) à sa forme canonique, None sinon."""
+        url = url.strip()
+        if not url or any(char.isspace() for char in url):
+            return None  # Recherche en texte libre, pas un lien
+        if "://" not in url:
+            url = f"https://{url}"
+        try:
+            parsed = urlparse(url)
+            host = (parsed.hostname or "").lower()
+        except ValueError:
+            return None  # Crochets ou port invalides : ce n'est pas un lien exploitable
+        if parsed.scheme not in ("http", "https"):
+            return None
+        query = parse_qs(parsed.query)
+        parts = [part for part in parsed.path.split("/") if part]
+        if host == "youtu.be" or host.endswith(".youtu.be"):
+            video_id = parts[0] if parts else None
+        elif any(host == domain or host.endswith(f".{domain}") for domain in YOUTUBE_HOSTS):
+            if parts == ["playlist"] and query.get('list'):
+                return f"https://www.youtube.com/playlist?list={query['list'][0]}"
+            video_id = query.get('v', [None])[0]
+            if video_id is None and len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v", "e"):
+                video_id = parts[1]
+        else:
+            return None
+        return f"https://www.youtube.com/watch?v={video_id}" if video_id and VIDEO_ID.match(video_id) else None
+
+    @staticmethod
+    def search_key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    async def search_tracks(self, query: str, guild_id=None) -> list:
+        """Recherche YouTube via le pool d'extraction ; les résultats sont gardés dans le cache des métadonnées."""
+        return await self.metadata.get_or_fetch(
+            ("search", self.search_key(query)), lambda: self.fetch_search(query, guild_id), retry_on=(ExtractionCancelled,)
+        )
+
+    async def fetch_search(self, query: str, guild_id=None) -> list:
+        info = await self.extractor.extract(f"ytsearch{SEARCH_RESULTS}:{query}", YDL_SEARCH_OPTS, guild_id=guild_id,
+                                            kind="search")
+        return [
+            {'id': entry['id'], 'title': entry.get('title') or entry['id'], 'duration': entry.get('duration')}
+            for entry in info.get('entries') or [] if entry and entry.get('id')
+        ]
+
+    async def find_track(self, query: str, guild_id=None):
+        """Piste d'une recherche libre : l'index local si tous les mots y correspondent, sinon YouTube."""
+        results = await asyncio.to_thread(self.index.search, query, 1, False)
+        if not results:
+            results = await self.search_tracks(query, guild_id)
+        return results[0] if results else None
+
+    async def remember_track(self, video_id: str, title: str, duration: float = None):
+        """Ajoute la piste lancée à l'index de l'autocomplétion."""
+        if not video_id or not title:
+            return
+        try:
+            await asyncio.to_thread(self.index.record, video_id, title, duration)
+        except Exception as e:
+            logger.warning(f"⚠️ Impossible d'indexer la piste {video_id} : {e}")
+
+    @staticmethod
+    def video_id_from_url(url: str):
+        """Extrait l'identifiant de la vidéo d'un lien YouTube (None si ce n'est pas un lien de vidéo reconnu)."""
+        canonical = MusicSlash.normalize_url(url)
+        return parse_qs(urlparse(canonical).query).get('v', [None])[0] if canonical else None
+
+    @staticmethod
+    def playlist_id_from_url(url: str):
+        """Retourne l'identifiant de playlist d'un lien /playlist (un lien watch?v=...&list=... reste une vidéo)."""
+        canonical = MusicSlash.normalize_url(url)
+        return parse_qs(urlparse(canonical).query).get('list', [None])[0] if canonical else None
+
+    def get_playback_mode(self, guild_id) -> str:
+        """Retourne le mode de lecture du serveur (par défaut celui de la configuration)."""
+        mode = self.playback_modes.get(guild_id, PLAYBACK_MODE)
+        return mode if mode in PLAYBACK_MODES else "stream"
+
+    @staticmethod
+    def create_audio_source(track: dict, start_at: float = 0.0, passthrough: bool = True) -> discord.AudioSource:
+        """Construit la source audio à partir d'une piste résolue, éventuellement à partir de `start_at` secondes."""
+        seek = f"-ss {start_at:.1f}" if start_at else ""
+        if track['mode'] == "download":
+            return discord.FFmpegPCMAudio(track['file_path'], before_options=seek or None)
+
+        options = dict(FFMPEG_STREAM_OPTIONS, before_options=f"{seek} {FFMPEG_STREAM_OPTIONS['before_options']}".strip())
+        # Les flux Opus sont transmis tels quels à Discord, sans ré-encodage (sauf pour le pipeline, qui mixe du PCM)
+        if passthrough and track.get('acodec') == 'opus' and track.get('asr') in (None, 48000):
+            return discord.FFmpegOpusAudio(track['url'], codec='copy', **options)
+        return discord.FFmpegPCMAudio(track['url'], **options)
+
+    async def open_audio_source(self, player, track: dict, start_at: float = 0.0,
+                                passthrough: bool = True) -> discord.AudioSource:
+        """Lance FFmpeg pour la piste dès qu'une place se libère (limite par machine, à tour de rôle entre serveurs)."""
+        return await self.governor.spawn(player.guild_id, lambda: self.create_audio_source(track, start_at, passthrough))
+
+    async def create_track_source(self, player, entry, track: dict, start_at: float = 0.0, on_start=None) -> TrackSource:
+        """Prépare une piste pour le pipeline, avec le gain tiré de la mesure faite lors d'une écoute précédente."""
+        video_id = track.get('id')
+        loudness = await asyncio.to_thread(self.cache.loudness, video_id) if LOUDNESS_NORMALIZATION and video_id else None
+        return TrackSource(
+            entry, await self.open_audio_source(player, track, start_at, passthrough=False), video_id=video_id, duration=track.get('duration'),
+            start_at=start_at, gain=gain_for(loudness),
+            measure=LOUDNESS_NORMALIZATION and video_id is not None and loudness is None, on_start=on_start
+        )
+
+    @staticmethod
+    def uses_pipeline(player) -> bool:
+        """Le pipeline (PCM) ne sert que s'il est activé ou si le volume du serveur a été modifié : sinon passthrough Opus."""
+        return AUDIO_PIPELINE or player.volume != 1.0
+
+    def create_pipeline(self, player) -> AudioPipeline:
+        loop = self.bot.loop
+        return AudioPipeline(
+            volume=player.volume,
+            on_track_start=lambda track: loop.call_soon_threadsafe(self.pipeline_advanced, player, track),
+            on_track_end=lambda track: asyncio.run_coroutine_threadsafe(self.store_loudness(track), loop),
+        )
+
+    async def store_loudness(self, track: TrackSource):
+        """Garde le niveau mesuré pendant l'écoute : les prochaines lectures de la piste seront normalisées."""
+        loudness = track.loudness()
+        if loudness is None:
+            return
+        try:
+            await asyncio.to_thread(self.cache.set_loudness, track.video_id, loudness)
+            logger.info(f"🔊 Niveau mesuré pour {track.entry.label} : {loudness:.1f} dBFS")
+        except Exception as e:
+            logger.warning(f"⚠️ Impossible d'enregistrer le niveau de {track.video_id} : {e}")
+
+    @staticmethod
+    def stream_expiry(stream_url: str):
+        """Lit l'horodatage d'expiration d'une URL de flux (paramètre `expire` des URL googlevideo)."""
+        expire = parse_qs(urlparse(stream_url).query).get('expire')
+        try:
+            return float(expire[0]) if expire else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def is_expiring(track: dict) -> bool:
+        """Vrai si l'URL de flux expirera avant la fin de la lecture de la piste."""
+        expires_at = track.get('expires_at')
+        if track['mode'] != "stream" or expires_at is None:
+            return False
+        return expires_at - time.time() < (track.get('duration') or 0) + STREAM_URL_MARGIN
+
+    async def resolve_track(self, url: str, mode: str, guild_id=None) -> dict:
+        """Résout une piste (métadonnées et URL du flux, ou fichier en mode téléchargement)."""
+        key = self.video_id_from_url(url) or url
+        if mode == "download":
+            # Le cache audio garde les fichiers : ici on ne fait que fusionner les téléchargements simultanés
+            return await self.metadata.get_or_fetch(
+                ("download", key), lambda: self.download_track(url, guild_id),
+                store=False, retry_on=(ExtractionCancelled,)
+            )
+
+        # L'entrée vit aussi longtemps que l'URL du flux qu'elle contient
+        def fetch_stream():
+            return self.metadata.get_or_fetch(
+                ("stream", key), lambda: self.fetch_stream_track(url, guild_id),
+                expires_at=lambda t: t['expires_at'] - STREAM_URL_MARGIN if t['expires_at'] else None,
+                retry_on=(ExtractionCancelled,)
+            )
+
+        track = await fetch_stream()
+        if self.is_expiring(track):
+            await self.metadata.invalidate(("stream", key))
+            track = await fetch_stream()
+        return track
+
+    async def fetch_stream_track(self, url: str, guild_id=None) -> dict:
+        """Extrait les métadonnées et l'URL directe du flux audio."""
+        info = await self.extractor.extract(url, YDL_STREAM_OPTS, guild_id=guild_id)
+        return self.compact_info(info, "stream")
+
+    async def download_track(self, url: str, guild_id=None) -> dict:
+        """Retourne le fichier audio depuis le cache, ou le télécharge puis l'y range."""
+        video_id = self.video_id_from_url(url)
+        cached = await asyncio.to_thread(self.cache.get, video_id) if video_id else None
+        if cached:
+            logger.info(f"💾 Lecture depuis le cache : {cached['title']}")
+            return dict(cached, mode="download", id=video_id, url=None, acodec=None, asr=None,
+                        formats=[], expires_at=None)
+
+        ydl_opts = dict(YDL_DOWNLOAD_OPTS, outtmpl=self.cache.tmp_template())
+        info = await self.extractor.extract(url, ydl_opts, download=True, guild_id=guild_id)
+        tmp_path = os.path.join(self.cache.tmp_folder, f"{info['id']}.mp3")
+        file_path = await asyncio.to_thread(self.cache.store, info['id'], tmp_path, info['title'], info.get('duration'))
+        return self.compact_info(info, "download", file_path)
+
+    def compact_info(self, info: dict, mode: str, file_path: str = None) -> dict:
+        """Ne garde que le strict nécessaire : le dictionnaire complet de yt-dlp est volumineux."""
+        return {
+            'mode': mode,
+            'id': info.get('id'),
+            'title': info['title'],
+            'duration': info.get('duration'),
+            'url': info.get('url'),
+            'acodec': info.get('acodec'),
+            'asr': info.get('asr'),
+            'formats': [
+                {'format_id': f.get('format_id'), 'acodec': f.get('acodec'), 'abr': f.get('abr'), 'asr': f.get('asr')}
+                for f in info.get('formats') or [] if f.get('vcodec') == 'none'
+            ],
+            'file_path': file_path,
+            'filesize': os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0,
+            'expires_at': self.stream_expiry(info['url']) if mode == "stream" and info.get('url') else None,
+        }
+
+    async def fetch_playlist_page(self, url: str, playlist_id: str, page: int, guild_id=None) -> dict:
+        """Retourne une page de la playlist, en extraction à plat : {'entries': [(url, titre)], 'has_more'}.
+
+        `has_more` se fonde sur le nombre brut d'entrées de la page : une vidéo privée ou supprimée, écartée
+        de `entries`, n'interrompt pas le chargement des pages suivantes.
+        """
+        start = page * PLAYLIST_PAGE_SIZE + 1
+        ydl_opts = dict(YDL_FLAT_OPTS, playlist_items=f"{start}-{start + PLAYLIST_PAGE_SIZE - 1}")
+
+        async def fetch():
+            info = await self.extractor.extract(url, ydl_opts, guild_id=guild_id, kind="playlist")
+            raw_entries = info.get('entries') or []
+            return {
+                'entries': [
+                    (f"https://www.youtube.com/watch?v={entry['id']}", entry.get('title'))
+                    for entry in raw_entries
+                    if entry and entry.get('id') and entry.get('title') not in ("[Private video]", "[Deleted video]")
+                ],
+                'has_more': len(raw_entries) >= PLAYLIST_PAGE_SIZE,
+            }
+
+        return await self.metadata.get_or_fetch(("playlist_page", playlist_id, page), fetch,
+                                                retry_on=(ExtractionCancelled,))
+
+    async def load_playlist(self, player, requester_id: int, channel_id: int, url: str, playlist_id: str, progress):
+        """Ajoute les pistes de la playlist page par page ; elles ne sont résolues qu'à l'approche de la lecture."""
+        added = 0
+        page = 0
+        try:
+            while added < PLAYLIST_MAX_TRACKS:
+                result = await self.fetch_playlist_page(url, playlist_id, page, player.guild_id)
+                entries = result['entries']
+                for entry_url, title in entries[:PLAYLIST_MAX_TRACKS - added]:
+                    player.queue.append(Track(entry_url, title, requester_id, channel_id))
+                added += min(len(entries), PLAYLIST_MAX_TRACKS - added)
+                player.touch()
+
+                if not player.is_playing and player.queue:
+                    player.is_playing = True
+                    self.schedule_next(player)
+                else:
+                    self.prefetch_upcoming(player)
+
+                if not result['has_more']:
+                    break
+                await progress(f"📜 Chargement de la playlist… {added} pistes ajoutées.")
+                page += 1
+
+            await progress(f"✅ Playlist ajoutée : {added} pistes.")
+            logger.info(f"📜 Playlist {playlist_id} : {added} pistes ajoutées (serveur {player.guild_id}).")
+        except ExtractionCancelled:
+            logger.info(f"🛑 Chargement de la playlist {playlist_id} interrompu.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du chargement de la playlist {playlist_id} : {e}")
+            await progress(f"❌ Playlist chargée partiellement : {added} pistes ajoutées.")
+
+    async def start_playlist(self, player, interaction: discord.Interaction, url: str, playlist_id: str):
+        """Répond immédiatement puis charge la playlist en arrière-plan."""
+        content = "📜 Chargement de la playlist…"
+        if not interaction.response.is_done():
+            await interaction.response.send_message(content, ephemeral=True)
+            edit = interaction.edit_original_response
+        else:
+            message = await self.followup(interaction, content, wait=True)
+            edit = message.edit if message else None
+
+        async def progress(text: str):
+            if edit is not None:
+                outbound.SCHEDULER.submit(("interaction", interaction.id), lambda: edit(content=text), outbound.INTERACTION)
+
+        if player.is_loading():
+            player.playlist_task.cancel()
+        player.playlist_task = asyncio.create_task(
+            self.load_playlist(player, interaction.user.id, interaction.channel_id, url, playlist_id, progress)
+        )
+
+    def prefetch_upcoming(self, player):
+        """Prépare en arrière-plan les PREFETCH_COUNT prochaines pistes de la file."""
+        mode = self.get_playback_mode(player.guild_id)
+        upcoming = [track.url for track in player.queue.peek(PREFETCH_COUNT)]
+
+        for url in list(player.prefetched):
+            if url not in upcoming:
+                player.prefetched.pop(url).cancel()
+
+        used_bytes = 0
+        for url in upcoming:
+            task = player.prefetched.get(url)
+            if task and task.done():
+                if task.cancelled() or task.exception() is not None:
+                    task = None
+                else:
+                    track = task.result()
+                    if track['mode'] != mode or self.is_expiring(track):
+                        task = None
+                    else:
+                        used_bytes += track['filesize']
+            if task is None:
+                if mode == "download" and used_bytes >= PREFETCH_MAX_BYTES:
+                    break
+                player.prefetched[url] = asyncio.create_task(self.resolve_track(url, mode, player.guild_id))
+        self.arm_next(player)
+
+    def arm_next(self, player):
+        """Prépare dans le pipeline la prochaine piste de la file, pour l'enchaîner sans coupure."""
+        if player.pipeline is None:
+            return
+        upcoming = player.queue.peek(1)
+        if upcoming and player.arm_entry is upcoming[0]:
+            return
+        player.disarm()
+        if upcoming:
+            player.arm_entry = upcoming[0]
+            player.arm_task = asyncio.create_task(self.arm_track(player, player.pipeline, upcoming[0]))
+
+    async def arm_track(self, player, pipeline: AudioPipeline, entry):
+        """Résout la piste, puis lance son décodeur peu avant la fin de la piste en cours."""
+        try:
+            mode = self.get_playback_mode(player.guild_id)
+            track = await self.take_prefetched(player, entry.url, mode)
+            # Un FFmpeg lancé trop tôt resterait bloqué (et son flux pourrait expirer) pendant toute la piste en cours
+            lead = PIPELINE_WARMUP + pipeline.crossfade
+            while pipeline.current is not None and (pipeline.current.remaining or 0) > lead:
+                await asyncio.sleep(pipeline.current.remaining - lead)
+            if self.is_expiring(track):
+                track = await self.resolve_track(entry.url, mode, player.guild_id)
+
+            entry.title = track['title']
+            queued_at = entry.queued_at
+
+            def on_first_packet(now):
+                metrics.TIME_TO_FIRST_AUDIO_SECONDS.observe(now - queued_at)
+
+            source = await self.create_track_source(player, entry, track, entry.start_at, on_first_packet)
+            if player.pipeline is not pipeline or player.arm_entry is not entry:
+                source.cleanup()
+                return
+            pipeline.set_next(source)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # La piste sera résolue normalement par play_next à la fin de la piste en cours
+            logger.warning(f"⚠️ Préparation de la piste suivante impossible ({entry.url}) : {e}")
+
+    def pipeline_advanced(self, player, track: TrackSource):
+        """Le pipeline est passé à la piste armée : la file et l'état du lecteur suivent."""
+        if player.pipeline is None:
+            return
+        entry = track.entry
+        player.arm_task = None
+        player.arm_entry = None
+        position = next((i for i, queued in enumerate(player.queue) if queued is entry), None)
+        if position is not None:
+            player.queue.remove(position)
+        metrics.QUEUE_WAIT_SECONDS.observe(time.monotonic() - entry.queued_at)
+        metrics.TRACKS_PLAYED.inc(mode=self.get_playback_mode(player.guild_id))
+        player.touch()
+        player.current = entry
+        player.start_track(entry.start_at, track.duration)
+        logger.info(f"🎶 Lecture de : {entry.label} (enchaînée, serveur {player.guild_id})")
+        self.prefetch_upcoming(player)
+        self.player_changed(player)
+        self.announce(player, entry)
+        asyncio.create_task(self.remember_track(track.video_id, entry.title, track.duration))
+
+    async def take_prefetched(self, player, url: str, mode: str) -> dict:
+        """Retourne la piste préparée à l'avance si elle est encore valable, sinon la résout."""
+        task = player.prefetched.pop(url, None)
+        if task is not None and not task.cancelled():
+            try:
+                track = await task
+                if track['mode'] == mode and not self.is_expiring(track):
+                    return track
+                logger.info(f"🔄 Piste préparée périmée, nouvelle résolution : {url}")
+            except Exception as e:
+                logger.warning(f"⚠️ Échec de la préparation anticipée de {url} : {e}")
+        return await self.resolve_track(url, mode, player.guild_id)
+
+    def schedule_next(self, player):
+        """Lance la tâche de lecture de la piste suivante pour ce serveur."""
+        if player.task and not player.task.done():
+            return
+        player.task = asyncio.create_task(self.play_next(player))
+
+    def announce(self, player, entry):
+        """Annonce la piste dans le salon, sauf si le serveur a un panneau (qui l'affiche déjà)."""
+        panels = self.bot.get_cog("ControlPanel")
+        if not (panels and panels.has_panel(player.guild_id)):
+            self.notify(entry.channel_id, f"🎶 En cours : {entry.label}")
+
+    def player_changed(self, player):
+        """Signale un changement d'état du lecteur (piste, file, arrêt) : le panneau en direct se met à jour."""
+        self.bot.dispatch("player_update", player.guild_id)
+
+    def notify(self, channel_id: int, content: str):
+        """Envoie un message dans le salon texte où la piste a été demandée (priorité basse, sans attendre).
+
+        Ne bloque jamais play_next : un skip arrivé pendant l'envoi doit pouvoir relancer la piste suivante.
+        """
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+        outbound.SCHEDULER.submit(("channel", channel_id), lambda: channel.send(content), outbound.NOTIFICATION)
+
+    def followup(self, interaction: discord.Interaction, content: str, **kwargs) -> asyncio.Future:
+        """Message de suivi d'une interaction, envoyé en priorité par l'ordonnanceur."""
+        return outbound.SCHEDULER.submit(("interaction", interaction.id),
+                                         lambda: interaction.followup.send(content, ephemeral=True, **kwargs),
+                                         outbound.INTERACTION)
+
+    async def reply(self, interaction: discord.Interaction, content: str):
+        """Répond à l'interaction : réponse initiale directe, sinon message de suivi."""
+        if not interaction.response.is_done():
+            await interaction.response.send_message(content, ephemeral=True)
+        else:
+            await self.followup(interaction, content)
+
+    async def play_next(self, player):
+        """Lit la musique suivante dans la file d'attente du serveur."""
+        async with player.lock:
+            player.touch()
+            player.disarm()
+            player.pipeline = None  # Le pipeline précédent s'est arrêté : on en crée un nouveau
+            if not player.queue:
+                player.is_playing = False
+                player.current = None
+                logger.info(f"🎵 Fin de la playlist (serveur {player.guild_id}).")
+                self.player_changed(player)
+                return
+
+            entry = player.current = player.queue.popleft()
+            popped_at = time.monotonic()
+            metrics.QUEUE_WAIT_SECONDS.observe(popped_at - entry.queued_at)
             try:
-                ydl_opts = {
-                    'format': 'bestaudio/best',
-                    'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '192'}],
-                    'outtmpl': 'music/%(title)s.%(ext)s',
-                    'quiet': True,
-                }
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=True)
-                    file_path = f"music/{info['title']}.mp3"
-
-                logger.info(f"🎶 Lecture de : {info['title']}")
-                self.is_playing = True
-                self.voice_client.play(
-                    discord.FFmpegPCMAudio(file_path),
-                    after=lambda e: asyncio.run_coroutine_threadsafe(self.play_next(), self.bot.loop)
+                mode = self.get_playback_mode(player.guild_id)
+                track = await self.take_prefetched(player, entry.url, mode)
+                entry.title = track['title']
+                queued_at = entry.queued_at
+
+                def on_first_packet(now):
+                    metrics.START_LATENCY_SECONDS.observe(now - popped_at)
+                    metrics.TIME_TO_FIRST_AUDIO_SECONDS.observe(now - queued_at)
+
+                pipelined = self.uses_pipeline(player)
+                if pipelined:
+                    source = self.create_pipeline(player)
+                    source.start(await self.create_track_source(player, entry, track, entry.start_at, on_first_packet))
+                else:
+                    source = metrics.TimedAudioSource(await self.open_audio_source(player, track, entry.start_at),
+                                                      on_first_packet)
+                if not player.is_connected():
+                    source.cleanup()
+                    player.is_playing = False
+                    player.current = None
+                    return
+
+                logger.info(f"🎶 Lecture de : {track['title']} (mode {mode}, serveur {player.guild_id})")
+                player.is_playing = True
+                player.start_track(entry.start_at, track.get('duration'))
+                metrics.TRACKS_PLAYED.inc(mode=mode)
+                player.voice_client.play(
+                    source,
+                    after=lambda e: self.bot.loop.call_soon_threadsafe(self.schedule_next, player)
                 )
-                await interaction.followup.send(f"🎶 En cours : {info['title']}")
+                if pipelined:
+                    player.pipeline = source
+                self.prefetch_upcoming(player)
+                self.player_changed(player)
+                self.announce(player, entry)
+                asyncio.create_task(self.remember_track(track.get('id'), track['title'], track.get('duration')))
+            except ExtractionCancelled:
+                logger.info(f"🛑 Extraction annulée (serveur {player.guild_id}).")
+                player.is_playing = False
+                player.current = None
+                self.player_changed(player)
+            except ExtractionTimeout:
+                logger.error(f"❌ Extraction trop longue pour : {entry.url}")
+                self.notify(entry.channel_id, "❌ Le chargement de la musique a pris trop de temps.")
+                player.is_playing = False
+                player.current = None
+                self.player_changed(player)
             except Exception as e:
                 logger.error(f"❌ Erreur : {e}")
-                await interaction.followup.send("❌ Impossible de lire la musique.")
-                self.is_playing = False
-        else:
-            self.is_playing = False
-            logger.info("🎵 Fin de la playlist.")
+                self.notify(entry.channel_id, "❌ Impossible de lire la musique.")
+                player.is_playing = False
+                player.current = None
+                self.player_changed(player)
 
-    async def play_music_from_panel(self, interaction: discord.Interaction, url: str):
-        """Ajoute une musique depuis le panneau interactif."""
+    async def play_music_from_panel(self, interaction: discord.Interaction, query: str):
+        """Ajoute une musique (lien YouTube ou recherche libre) depuis /play ou le panneau interactif."""
         try:
-            if not self.is_valid_url(url):
+            url, title = self.normalize_url(query), None
+            if url is None:
+                if re.match(r"^\w+://", query.strip()):
+                    await self.reply(interaction, "❌ Lien YouTube invalide.")
+                    return
                 if not interaction.response.is_done():
-                    await interaction.response.send_message("❌ Lien YouTube invalide.", ephemeral=True)
-                else:
-                    await interaction.followup.send("❌ Lien YouTube invalide.", ephemeral=True)
-                return
+                    await interaction.response.defer(ephemeral=True, thinking=True)  # La recherche peut dépasser 3 s
+                result = await self.find_track(query, interaction.guild_id)
+                if result is None:
+                    await self.reply(interaction, f"❌ Aucun résultat pour « {query} ».")
+                    return
+                url, title = f"https://www.youtube.com/watch?v={result['id']}", result['title']
 
-            if not self.voice_client or not self.voice_client.is_connected():
+            player = self.players.get(interaction.guild_id)
+            if not player.is_connected():
                 if interaction.user.voice:
-                    self.voice_client = await interaction.user.voice.channel.connect()
+                    player.voice_client = interaction.guild.voice_client or await interaction.user.voice.channel.connect()
                 else:
-                    if not interaction.response.is_done():
-                        await interaction.response.send_message("❌ Vous devez être dans un canal vocal.", ephemeral=True)
-                    else:
-                        await interaction.followup.send("❌ Vous devez être dans un canal vocal.", ephemeral=True)
+                    await self.reply(interaction, "❌ Vous devez être dans un canal vocal.")
                     return
 
-            self.queue.append((url, interaction))
-            if not interaction.response.is_done():
-                await interaction.response.send_message(f"🎵 Musique ajoutée : {url}", ephemeral=True)
-            else:
-                await interaction.followup.send(f"🎵 Musique ajoutée : {url}", ephemeral=True)
+            playlist_id = self.playlist_id_from_url(url)
+            if playlist_id:
+                await self.start_playlist(player, interaction, url, playlist_id)
+                return
 
-            if not self.is_playing:
-                self.is_playing = True
-                await self.play_next()
+            player.queue.append(Track(url, title, interaction.user.id, interaction.channel_id))
+            self.player_changed(player)
+            await self.reply(interaction, f"🎵 Musique ajoutée : {title} ({url})" if title else f"🎵 Musique ajoutée : {url}")
+
+            if not player.is_playing:
+                player.is_playing = True
+                self.schedule_next(player)
+            else:
+                self.prefetch_upcoming(player)
 
         except Exception as e:
             logger.error(f"❌ Erreur ajout de musique depuis le panneau : {e}")
-            if not interaction.response.is_done():
-                await interaction.response.send_message("❌ Une erreur est survenue.", ephemeral=True)
-            else:
-                await interaction.followup.send("❌ Une erreur est survenue.", ephemeral=True)
+            await self.reply(interaction, "❌ Une erreur est survenue.")
 
     async def skip_music(self, interaction: discord.Interaction):
         """Passe à la musique suivante."""
-        if self.voice_client and self.voice_client.is_playing():
-            self.voice_client.stop()
+        player = self.players.peek(interaction.guild_id)
+        if player and player.is_connected() and player.voice_client.is_playing():
+            player.touch()
+            # Piste suivante déjà prête dans le pipeline : passage immédiat, sinon arrêt et lecture à froid
+            if not (player.pipeline and player.pipeline.skip()):
+                player.voice_client.stop()
             await interaction.response.send_message("⏭ Musique suivante...", ephemeral=True)
         else:
             await interaction.response.send_message("❌ Aucune musique en cours de lecture.", ephemeral=True)
 
     async def stop_music(self, interaction: discord.Interaction):
         """Arrête la lecture."""
-        if self.voice_client:
-            self.voice_client.stop()
-            self.queue.clear()
-            self.is_playing = False
+        player = self.players.peek(interaction.guild_id)
+        if player and player.voice_client:
+            self.extractor.cancel_guild(interaction.guild_id)
+            player.reset()
+            player.voice_client.stop()
+            self.player_changed(player)
             await interaction.response.send_message("🛑 Musique arrêtée et file d'attente vidée.", ephemeral=True)
         else:
             await interaction.response.send_message("❌ Le bot n'est pas connecté à un canal vocal.", ephemeral=True)
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
-        """Nettoyage des fichiers lors de la déconnexion vocale."""
+        """Libère le lecteur du serveur lors de la déconnexion vocale."""
         if member == self.bot.user and before.channel and not after.channel:
-            logger.info("👋 Le bot a quitté le vocal. Nettoyage des fichiers...")
-            self.cleanup_audio_files()
-            self.queue.clear()
-            self.is_playing = False
+            logger.info(f"👋 Le bot a quitté le vocal (serveur {member.guild.id}).")
+            self.extractor.cancel_guild(member.guild.id)
+            self.players.remove(member.guild.id)
+            self.bot.dispatch("player_update", member.guild.id)
 
-    @app_commands.command(name="play", description="Joue une musique depuis un lien YouTube.")
+    @app_commands.command(name="play", description="Joue une musique ou une playlist (lien YouTube ou recherche).")
+    @app_commands.describe(url="Lien YouTube, ou titre à rechercher")
     async def play(self, interaction: discord.Interaction, url: str):
         """Ajoute une musique à la file d'attente."""
         await self.play_music_from_panel(interaction, url)
 
+    @play.autocomplete("url")
+    async def play_autocomplete(self, interaction: discord.Interaction, current: str) -> list:
+        """Suggestions tirées de l'index local et des recherches déjà en cache : aucun appel à YouTube ici."""
+        if len(current.strip()) < 2 or self.normalize_url(current):
+            return []
+        results = await asyncio.to_thread(self.index.search, current, 25)
+        results += self.metadata.get(("search", self.search_key(current))) or []
+        choices, seen = [], set()
+        for result in results:
+            if result['id'] in seen:
+                continue
+            seen.add(result['id'])
+            duration = result.get('duration')
+            suffix = f" ({int(duration) // 60}:{int(duration) % 60:02d})" if duration else ""
+            choices.append(app_commands.Choice(name=result['title'][:100 - len(suffix)] + suffix,
+                                               value=f"https://www.youtube.com/watch?v={result['id']}"))
+        return choices[:25]
+
     @app_commands.command(name="skip", description="Passe à la musique suivante.")
     async def skip(self, interaction: discord.Interaction):
         """Passe à la musique suivante."""
@@ -149,13 +872,122 @@ class MusicSlash(commands.Cog):
         """Arrête la musique."""
         await self.stop_music(interaction)
 
-    @app_commands.command(name="quitte", description="Déconnecte le bot et nettoie les fichiers.")
+    @app_commands.command(name="queue", description="Affiche la file d'attente.")
+    async def queue(self, interaction: discord.Interaction, page: int = 1):
+        """Affiche une page de la file d'attente du serveur."""
+        player = self.players.peek(interaction.guild_id)
+        if not player or (not player.queue and not player.current):
+            await interaction.response.send_message("📭 La file d'attente est vide.", ephemeral=True)
+            return
+
+        pages = max(1, -(-len(player.queue) // QUEUE_PAGE_SIZE))
+        page = max(1, min(page, pages))
+        start = (page - 1) * QUEUE_PAGE_SIZE
+        lines = [
+            f"`{start + i + 1}.` {track.label} — <@{track.requester_id}>"
+            for i, track in enumerate(player.queue.peek(start + QUEUE_PAGE_SIZE)[start:])
+        ]
+        embed = discord.Embed(title="🎶 File d'attente", description="\n".join(lines) or "Aucune piste en attente.",
+                              color=discord.Color.red())
+        if player.current:
+            embed.add_field(name="En cours", value=player.current.label, inline=False)
+        mode = " • mode équitable" if player.queue.fair else ""
+        embed.set_footer(text=f"Page {page}/{pages} • {len(player.queue)} piste(s){mode}")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="remove", description="Retire une piste de la file d'attente.")
+    async def remove(self, interaction: discord.Interaction, position: int):
+        """Retire la piste à la position indiquée (1 = prochaine piste)."""
+        player = self.players.peek(interaction.guild_id)
+        if not player or not 1 <= position <= len(player.queue):
+            await interaction.response.send_message("❌ Position invalide.", ephemeral=True)
+            return
+        try:
+            track = player.queue.remove(position - 1)
+        except IndexError:
+            track = None
+        if track is None:
+            await interaction.response.send_message("❌ Position invalide.", ephemeral=True)
+            return
+        self.prefetch_upcoming(player)
+        await interaction.response.send_message(f"🗑️ Retirée : {track.label}", ephemeral=True)
+
+    @app_commands.command(name="move", description="Déplace une piste dans la file d'attente.")
+    async def move(self, interaction: discord.Interaction, position: int, destination: int):
+        """Déplace la piste `position` vers `destination` (positions à partir de 1)."""
+        player = self.players.peek(interaction.guild_id)
+        if not player or not 1 <= position <= len(player.queue) or not 1 <= destination <= len(player.queue):
+            await interaction.response.send_message("❌ Position invalide.", ephemeral=True)
+            return
+        try:
+            track = player.queue.move(position - 1, destination - 1)
+        except ValueError:
+            await interaction.response.send_message("❌ Impossible de déplacer une piste en mode équitable.", ephemeral=True)
+            return
+        self.prefetch_upcoming(player)
+        await interaction.response.send_message(f"↕️ {track.label} déplacée en position {destination}.", ephemeral=True)
+
+    @app_commands.command(name="shuffle", description="Mélange la file d'attente.")
+    async def shuffle(self, interaction: discord.Interaction):
+        player = self.players.peek(interaction.guild_id)
+        if not player or not player.queue:
+            await interaction.response.send_message("📭 La file d'attente est vide.", ephemeral=True)
+            return
+        player.queue.shuffle()
+        self.prefetch_upcoming(player)
+        await interaction.response.send_message("🔀 File d'attente mélangée.", ephemeral=True)
+
+    @app_commands.command(name="doublons", description="Retire les pistes en double de la file d'attente.")
+    async def doublons(self, interaction: discord.Interaction):
+        player = self.players.peek(interaction.guild_id)
+        removed = player.queue.dedupe() if player else 0
+        if removed:
+            self.prefetch_upcoming(player)
+        await interaction.response.send_message(f"🧹 {removed} doublon(s) retiré(s).", ephemeral=True)
+
+    @app_commands.command(name="equitable", description="Active le tour de rôle entre les utilisateurs dans la file.")
+    async def equitable(self, interaction: discord.Interaction, actif: bool):
+        """En mode équitable, les pistes de chaque utilisateur sont lues à tour de rôle."""
+        player = self.players.get(interaction.guild_id)
+        player.queue.fair = actif
+        self.prefetch_upcoming(player)
+        etat = "activé" if actif else "désactivé"
+        await interaction.response.send_message(f"⚖️ Mode équitable {etat}.", ephemeral=True)
+
+    @app_commands.command(name="volume", description="Règle le volume du bot sur ce serveur (0 à 200 %).")
+    async def volume(self, interaction: discord.Interaction, pourcentage: app_commands.Range[int, 0, 200]):
+        """Appliqué à la trame suivante par le pipeline audio, sans relancer FFmpeg (à la piste suivante hors pipeline)."""
+        player = self.players.get(interaction.guild_id)
+        player.volume = pourcentage / 100
+        if player.pipeline:
+            player.pipeline.volume = player.volume
+        elif player.current is not None:
+            await interaction.response.send_message(f"🔊 Volume : {pourcentage} % (à partir de la piste suivante)", ephemeral=True)
+            return
+        await interaction.response.send_message(f"🔊 Volume : {pourcentage} %", ephemeral=True)
+
+    @app_commands.command(name="mode", description="Choisit le mode de lecture (direct ou téléchargement).")
+    @app_commands.choices(mode=[
+        app_commands.Choice(name="Lecture directe (stream)", value="stream"),
+        app_commands.Choice(name="Téléchargement MP3 (download)", value="download"),
+    ])
+    async def mode(self, interaction: discord.Interaction, mode: app_commands.Choice[str]):
+        """Change le mode de lecture pour ce serveur."""
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ Vous n'avez pas les permissions requises.", ephemeral=True)
+            return
+        self.playback_modes[interaction.guild_id] = mode.value
+        logger.info(f"🔧 Mode de lecture du serveur {interaction.guild_id} : {mode.value}")
+        await interaction.response.send_message(f"✅ Mode de lecture : {mode.name}", ephemeral=True)
+
+    @app_commands.command(name="quitte", description="Déconnecte le bot du canal vocal.")
     async def quitte(self, interaction: discord.Interaction):
-        if self.voice_client:
-            await self.voice_client.disconnect()
-            self.cleanup_audio_files()
-            self.queue.clear()
-            self.is_playing = False
+        player = self.players.peek(interaction.guild_id)
+        if player and player.voice_client:
+            self.extractor.cancel_guild(interaction.guild_id)
+            player.reset()
+            await player.voice_client.disconnect()
+            self.players.remove(interaction.guild_id)
             await interaction.response.send_message("👋 Déconnexion réussie.")
         else:
             await interaction.response.send_message("❌ Le bot n'est pas connecté.")
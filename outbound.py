@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import time
+from collections import deque
+import discord
+from config import OUTBOUND_ROUTE_BURST, OUTBOUND_ROUTE_PERIOD, OUTBOUND_GLOBAL_RATE
+from config import OUTBOUND_MAX_PENDING, OUTBOUND_MAX_AGE, ERROR_DIGEST_INTERVAL
+import metrics
+
+logger = logging.getLogger("Outbound")
+
+# Classes de priorité : les réponses aux interactions passent avant les erreurs, puis les notifications
+INTERACTION = 0
+ERROR = 1
+NOTIFICATION = 2
+PRIORITY_NAMES = {INTERACTION: "interaction", ERROR: "error", NOTIFICATION: "notification"}
+
+MESSAGES = metrics.counter("bot_outbound_messages_total",
+                           "Messages sortants (priority=interaction|error|notification, result=sent|dropped|failed).")
+WAIT_SECONDS = metrics.histogram("bot_outbound_wait_seconds", "Attente d'un message dans l'ordonnanceur avant son envoi.")
+DIGEST_MAX_LENGTH = 1900  # Marge sous la limite de 2000 caractères d'un message Discord
+
+
+class TokenBucket:
+    """Seau à jetons : `capacity` envois d'affilée, puis un envoi toutes les `period / capacity` secondes."""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """Secondes avant qu'un jeton soit disponible (0 s'il y en a un)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        return self.wait_time(now) == 0 and self.tokens >= self.capacity
+
+
+class OutboundScheduler:
+    """Ordonnanceur central des messages sortants.
+
+    Chaque envoi est une fonction sans argument qui retourne la coroutine d'appel REST. Les envois sont
+    choisis par priorité puis dans l'ordre d'arrivée, sous réserve d'un jeton sur leur route (salon ou
+    interaction) et, hors interactions, sur le budget global. Quand la file déborde ou qu'une notification
+    attend trop longtemps, les notifications sont abandonnées en premier.
+    """
+
+    def __init__(self, route_burst: int = OUTBOUND_ROUTE_BURST, route_period: float = OUTBOUND_ROUTE_PERIOD,
+                 global_rate: float = OUTBOUND_GLOBAL_RATE, max_pending: int = OUTBOUND_MAX_PENDING,
+                 max_age: float = OUTBOUND_MAX_AGE, digest_interval: float = ERROR_DIGEST_INTERVAL):
+        self.route_burst = route_burst
+        self.route_period = route_period
+        self.global_bucket = TokenBucket(global_rate, 1.0)
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.digest_interval = digest_interval
+        self.queues = {priority: deque() for priority in PRIORITY_NAMES}  # (arrivée, route, envoi, futur)
+        self.routes = {}  # route -> TokenBucket
+        self.errors = {}  # (bot, channel_id) -> {signature: [occurrences, exemple complet]}
+        self.sending = set()  # Tâches d'envoi en cours
+        self._wakeup = None
+        self._task = None
+        self._digest_task = None
+        metrics.gauge("bot_outbound_pending", "Messages en attente d'envoi par priorité.", lambda: {
+            (("priority", PRIORITY_NAMES[priority]),): len(queue) for priority, queue in self.queues.items()
+        })
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _ensure_started(self):
+        """Démarre les tâches de fond sur la boucle courante (une fois, ou après un redémarrage de la boucle)."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._dispatch())
+            self._digest_task = loop.create_task(self._digest_loop())
+
+    def submit(self, route, send, priority: int = NOTIFICATION) -> asyncio.Future:
+        """Met un envoi en file ; le futur reçoit le résultat de l'appel REST (None si abandonné ou en échec)."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        if len(self) >= self.max_pending and not self._drop_oldest_notification():
+            if priority == NOTIFICATION:
+                self._drop(priority, future)
+                return future
+        self.queues[priority].append((time.monotonic(), route, send, future))
+        self._wakeup.set()
+        return future
+
+    def _drop(self, priority: int, future: asyncio.Future):
+        MESSAGES.inc(priority=PRIORITY_NAMES[priority], result="dropped")
+        if not future.done():
+            future.set_result(None)
+
+    def _drop_oldest_notification(self) -> bool:
+        queue = self.queues[NOTIFICATION]
+        if not queue:
+            return False
+        self._drop(NOTIFICATION, queue.popleft()[3])
+        return True
+
+    def _next_ready(self, now: float):
+        """Retourne ((priorité, index) de l'envoi prêt, None) ou (None, délai avant le prochain jeton)."""
+        delay = None
+        for priority, queue in self.queues.items():
+            if priority == NOTIFICATION:
+                while queue and now - queue[0][0] > self.max_age:
+                    self._drop(priority, queue.popleft()[3])  # Une notification périmée ne sert plus à rien
+            blocked = set()
+            for index, (_, route, _, _) in enumerate(queue):
+                if route in blocked:
+                    continue
+                bucket = self.routes.get(route)
+                if bucket is None:
+                    bucket = self.routes[route] = TokenBucket(self.route_burst, self.route_period)
+                wait = bucket.wait_time(now)
+                if wait == 0 and priority != INTERACTION:
+                    # Les interactions ne comptent pas dans la limite globale de Discord
+                    wait = self.global_bucket.wait_time(now)
+                if wait == 0:
+                    return (priority, index), None
+                blocked.add(route)
+                delay = wait if delay is None else min(delay, wait)
+        return None, delay
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            ready, delay = self._next_ready(now)
+            if ready is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            priority, index = ready
+            queue = self.queues[priority]
+            queued_at, route, send, future = queue[index]
+            del queue[index]
+            self.routes[route].take()
+            if priority != INTERACTION:
+                self.global_bucket.take()
+            WAIT_SECONDS.observe(now - queued_at)
+            task = asyncio.create_task(self._send(priority, send, future))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+            self._forget_idle_routes(now)
+
+    def _forget_idle_routes(self, now: float):
+        """Oublie les routes dont le seau est plein : elles ne limitent plus rien."""
+        if len(self.routes) > 4 * self.max_pending:
+            for route in [route for route, bucket in self.routes.items() if bucket.is_full(now)]:
+                del self.routes[route]
+
+    async def _send(self, priority: int, send, future: asyncio.Future):
+        try:
+            result = await send()
+            MESSAGES.inc(priority=PRIORITY_NAMES[priority], result="sent")
+        except discord.HTTPException as e:
+            MESSAGES.inc(priority=PRIORITY_NAMES[priority], result="failed")
+            logger.warning(f"⚠️ Envoi impossible ({PRIORITY_NAMES[priority]}) : {e}")
+            result = None
+        except Exception as e:
+            MESSAGES.inc(priority=PRIORITY_NAMES[priority], result="failed")
+            logger.error(f"❌ Erreur lors d'un envoi ({PRIORITY_NAMES[priority]}) : {e}")
+            result = None
+        if not future.done():
+            future.set_result(result)
+
+    def report_error(self, bot, channel_id: int, error_message: str):
+        """Enregistre une erreur pour le prochain résumé du salon : les répétitions sont seulement comptées."""
+        self._ensure_started()
+        lines = error_message.strip().splitlines() or ["?"]
+        signature = lines[-1][:200]  # Dernière ligne d'une trace : type et message de l'exception
+        errors = self.errors.setdefault((bot, channel_id), {})
+        entry = errors.get(signature)
+        if entry is None:
+            errors[signature] = [1, error_message]
+        else:
+            entry[0] += 1
+
+    async def _digest_loop(self):
+        while True:
+            await asyncio.sleep(self.digest_interval)
+            self.flush_errors()
+
+    def flush_errors(self):
+        """Envoie un résumé par salon des erreurs accumulées depuis le dernier passage."""
+        errors, self.errors = self.errors, {}
+        for (bot, channel_id), entries in errors.items():
+            channel = bot.get_channel(channel_id)
+            if channel is None:
+                continue
+            content = self.format_digest(entries)
+            self.submit(("channel", channel_id), lambda channel=channel, content=content: channel.send(content), ERROR)
+
+    def format_digest(self, entries: dict) -> str:
+        total = sum(count for count, _ in entries.values())
+        lines = [f"⚠️ **{total} erreur(s) détectée(s)** ({len(entries)} distincte(s)) :"]
+        for signature, (count, _) in sorted(entries.items(), key=lambda item: -item[1][0]):
+            lines.append(f"• ×{count} `{signature}`")
+        # Trace complète de l'erreur la plus fréquente, dans la place restante
+        _, sample = max(entries.values(), key=lambda entry: entry[0])
+        header = "\n".join(lines)[:DIGEST_MAX_LENGTH - 10]
+        room = DIGEST_MAX_LENGTH - len(header) - 10
+        if room > 100:
+            header += f"\n```{sample[-room:]}```"
+        return header
+
+    def stats(self) -> dict:
+        return {
+            'pending': {PRIORITY_NAMES[priority]: len(queue) for priority, queue in self.queues.items()},
+            'sending': len(self.sending),
+            'routes': len(self.routes),
+            'errors': sum(len(entries) for entries in self.errors.values()),
+        }
+
+
+SCHEDULER = OutboundScheduler()
@@ -0,0 +1,39 @@
+import sqlite3
+import threading
+from config import PANEL_DB_FILE
+
+
+class PanelStore:
+    """Emplacement du panneau de contrôle de chaque serveur (salon et message), indexé par guild_id."""
+
+    def __init__(self, path: str = PANEL_DB_FILE):
+        self._lock = threading.Lock()  # Appelé via asyncio.to_thread
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)  # Fichier partagé par les processus shards
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS panels ("
+            " guild_id INTEGER PRIMARY KEY, channel_id INTEGER NOT NULL, message_id INTEGER NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS panels_message ON panels (message_id)")
+        self.db.commit()
+
+    def load_all(self) -> dict:
+        """Retourne {guild_id: (channel_id, message_id)}."""
+        with self._lock:
+            rows = self.db.execute("SELECT guild_id, channel_id, message_id FROM panels").fetchall()
+        return {guild_id: (channel_id, message_id) for guild_id, channel_id, message_id in rows}
+
+    def save(self, guild_id: int, channel_id: int, message_id: int):
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO panels (guild_id, channel_id, message_id) VALUES (?, ?, ?)",
+                (guild_id, channel_id, message_id),
+            )
+
+    def delete(self, guild_id: int):
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM panels WHERE guild_id = ?", (guild_id,))
+
+    def close(self):
+        with self._lock:
+            self.db.close()
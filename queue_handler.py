@@ -1,19 +1,91 @@
-import json
-import os
-
-QUEUE_FILE = "queue_backup.json"
-
-def save_queue(queue):
-    """Sauvegarde la file d'attente dans un fichier JSON."""
-    with open(QUEUE_FILE, "w") as f:
-        json.dump(queue, f)
-
-def load_queue():
-    """Charge la file d'attente depuis un fichier JSON."""
-    if os.path.exists(QUEUE_FILE):
-        with open(QUEUE_FILE, "r") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return []
-    return []
+import logging
+import sqlite3
+import threading
+import time
+from config import QUEUE_DB_FILE
+
+logger = logging.getLogger("QueueStore")
+
+
+class QueueStore:
+    """
+    Sauvegarde des files d'attente par serveur dans SQLite (mode WAL).
+
+    Seules les métadonnées des pistes sont stockées. Les écritures sont groupées : l'appelant
+    transmet périodiquement un instantané des serveurs modifiés, écrit en une seule transaction.
+    """
+
+    def __init__(self, path: str = QUEUE_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()  # Les écritures sont faites hors de la boucle asyncio
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)  # Fichier partagé par les processus shards
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # Un fsync par point de contrôle, pas par transaction
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS players ("
+            " guild_id INTEGER PRIMARY KEY, voice_channel_id INTEGER, fair INTEGER NOT NULL DEFAULT 0,"
+            " has_current INTEGER NOT NULL DEFAULT 0, position REAL NOT NULL DEFAULT 0, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            " guild_id INTEGER NOT NULL, idx INTEGER NOT NULL, url TEXT NOT NULL, title TEXT,"
+            " requester_id INTEGER, channel_id INTEGER, PRIMARY KEY (guild_id, idx));"
+        )
+        self.db.commit()
+
+    def write(self, snapshots: list, removed: list = ()):
+        """
+        Écrit les instantanés en une transaction.
+
+        Chaque instantané est un dict : guild_id, voice_channel_id, fair, position, tracks (liste de tuples
+        url, titre, requester_id, channel_id), queue_changed et has_current (la piste en cours est tracks[0]).
+        """
+        now = time.time()
+        with self._lock, self.db:
+            for guild_id in removed:
+                self.db.execute("DELETE FROM players WHERE guild_id = ?", (guild_id,))
+                self.db.execute("DELETE FROM tracks WHERE guild_id = ?", (guild_id,))
+            for snap in snapshots:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO players (guild_id, voice_channel_id, fair, has_current, position, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (snap['guild_id'], snap['voice_channel_id'], int(snap['fair']), int(snap['has_current']),
+                     snap['position'], now),
+                )
+                if not snap['queue_changed']:
+                    continue
+                self.db.execute("DELETE FROM tracks WHERE guild_id = ?", (snap['guild_id'],))
+                self.db.executemany(
+                    "INSERT INTO tracks (guild_id, idx, url, title, requester_id, channel_id) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(snap['guild_id'], idx, *track) for idx, track in enumerate(snap['tracks'])],
+                )
+
+    def load_all(self) -> list:
+        """Retourne les files sauvegardées, dans le même format que `write`."""
+        with self._lock:
+            players = self.db.execute(
+                "SELECT guild_id, voice_channel_id, fair, has_current, position FROM players"
+            ).fetchall()
+            saved = []
+            for guild_id, voice_channel_id, fair, has_current, position in players:
+                tracks = self.db.execute(
+                    "SELECT url, title, requester_id, channel_id FROM tracks WHERE guild_id = ? ORDER BY idx",
+                    (guild_id,),
+                ).fetchall()
+                saved.append({
+                    'guild_id': guild_id,
+                    'voice_channel_id': voice_channel_id,
+                    'fair': bool(fair),
+                    'has_current': bool(has_current),
+                    'position': position,
+                    'tracks': tracks,
+                })
+        return saved
+
+    def compact(self):
+        """Reporte le journal WAL dans la base et le tronque."""
+        with self._lock:
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.info("🗜️ Journal des files d'attente compacté.")
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, deque
+import discord
+from config import FFMPEG_MAX_PROCESSES, FFMPEG_STALL_TIMEOUT, SHARD_PROCESSES, SUPERVISED
+import metrics
+
+logger = logging.getLogger("ResourceGovernor")
+
+REAPED = metrics.counter("bot_ffmpeg_reaped_total", "Processus FFmpeg récupérés par le gardien (reason=stalled|exited|orphaned).")
+
+
+def host_share(limit: int) -> int:
+    """Part d'une limite par machine revenant à ce processus (le superviseur en lance SHARD_PROCESSES)."""
+    return max(1, limit // SHARD_PROCESSES) if SUPERVISED else limit
+
+
+class FairLimiter:
+    """Sémaphore équitable entre serveurs : les places libérées sont attribuées à tour de rôle.
+
+    Un serveur qui charge une playlist de 200 pistes ne passe pas devant les autres : chaque serveur
+    en attente reçoit une place avant qu'un même serveur en obtienne une deuxième.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self.waiters = {}  # clé (serveur) -> futurs en attente, dans l'ordre d'arrivée
+        self.rotation = deque()  # Clés ayant des demandes en attente, dans l'ordre de passage
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self.waiters.values())
+
+    async def acquire(self, key=None):
+        if self.in_use < self.capacity and not self.rotation:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue = self.waiters.get(key)
+        if queue is None:
+            queue = self.waiters[key] = deque()
+            self.rotation.append(key)
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # La place venait d'être attribuée : elle passe au suivant
+            else:
+                self._discard(key, future)
+            raise
+
+    def _discard(self, key, future: asyncio.Future):
+        queue = self.waiters.get(key)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        if not queue:
+            del self.waiters[key]
+            self.rotation.remove(key)
+
+    def release(self):
+        """Rend une place : elle passe directement au prochain serveur de la rotation, s'il y en a un."""
+        while self.rotation:
+            key = self.rotation.popleft()
+            queue = self.waiters[key]
+            future = queue.popleft()
+            if queue:
+                self.rotation.append(key)
+            else:
+                del self.waiters[key]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+
+class GovernedSource(discord.AudioSource):
+    """Source FFmpeg comptée dans la limite : rend sa place au nettoyage et note ses lectures en cours."""
+
+    def __init__(self, governor, source: discord.AudioSource, guild_id):
+        self.governor = governor
+        self.source = source
+        self.guild_id = guild_id
+        self.last_activity = time.monotonic()  # Création ou fin de la dernière lecture
+        self.reading_since = None  # Début de la lecture en cours (thread audio), None entre deux trames
+        self.closed = False
+
+    @property
+    def process(self):
+        """Processus FFmpeg de la source (None pour une source sans processus)."""
+        return getattr(self.source, '_process', None)
+
+    def read(self) -> bytes:
+        self.reading_since = time.monotonic()
+        try:
+            return self.source.read()
+        finally:
+            self.last_activity = time.monotonic()
+            self.reading_since = None
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.source.cleanup()
+        finally:
+            self.governor.release(self)
+
+
+class ResourceGovernor:
+    """Limite les processus FFmpeg de la machine et récupère ceux qui sont bloqués ou abandonnés.
+
+    Chaque source FFmpeg attend une place (à tour de rôle entre serveurs) avant d'être lancée. `reap()`
+    arrête les FFmpeg dont une lecture est bloquée depuis `stall_timeout`, et libère les sources (terminées
+    ou non) restées sans lecture alors que leur serveur n'a plus de connexion vocale.
+    """
+
+    def __init__(self, max_processes: int = host_share(FFMPEG_MAX_PROCESSES), stall_timeout: float = FFMPEG_STALL_TIMEOUT):
+        self.limiter = FairLimiter(max_processes)
+        self.stall_timeout = stall_timeout
+        self.sources = set()  # GovernedSource non nettoyées
+        self.reaped = Counter()  # Raison -> processus récupérés
+        self._lock = threading.Lock()  # Les sources sont nettoyées depuis le thread audio
+        self._loop = None
+
+        metrics.gauge("bot_ffmpeg_processes", "Sources FFmpeg ouvertes.", lambda: {(): len(self.sources)})
+        metrics.gauge("bot_ffmpeg_waiting", "Sources FFmpeg en attente d'une place.", lambda: {(): self.limiter.waiting})
+
+    async def spawn(self, guild_id, factory) -> GovernedSource:
+        """Attend une place FFmpeg pour le serveur, puis construit la source avec `factory()`."""
+        self._loop = asyncio.get_running_loop()
+        if self.limiter.in_use >= self.limiter.capacity:
+            logger.warning(f"⏳ Limite FFmpeg atteinte ({self.limiter.capacity}), serveur {guild_id} en attente "
+                           f"({self.limiter.waiting + 1} demande(s)).")
+        await self.limiter.acquire(guild_id)
+        try:
+            source = GovernedSource(self, factory(), guild_id)
+        except BaseException:
+            self.limiter.release()
+            raise
+        with self._lock:
+            self.sources.add(source)
+        return source
+
+    def release(self, source: GovernedSource):
+        with self._lock:
+            if source not in self.sources:
+                return
+            self.sources.discard(source)
+        try:
+            self._loop.call_soon_threadsafe(self.limiter.release)
+        except RuntimeError:
+            pass  # Boucle déjà fermée (arrêt du bot)
+
+    async def reap(self, is_active) -> int:
+        """Récupère les FFmpeg bloqués ou abandonnés ; `is_active(guild_id)` dit si le serveur joue encore."""
+        now = time.monotonic()
+        with self._lock:
+            sources = list(self.sources)
+        reaped = 0
+        for source in sources:
+            process = source.process
+            reading_since = source.reading_since
+            if reading_since is not None:
+                if now - reading_since > self.stall_timeout and process is not None and process.poll() is None:
+                    # Le thread audio est bloqué sur le tube : tuer FFmpeg lui rend la main (fin de piste)
+                    logger.warning(f"🔪 FFmpeg bloqué depuis {now - reading_since:.0f} s (serveur {source.guild_id}), arrêt.")
+                    process.kill()
+                    reason = "stalled"
+                else:
+                    continue
+            else:
+                # poll() récupère un processus terminé (zombie) ; sa source reste à libérer si plus personne ne la lit
+                exited = process is None or process.poll() is not None
+                if now - source.last_activity <= self.stall_timeout or is_active(source.guild_id):
+                    continue
+                reason = "exited" if exited else "orphaned"
+                await asyncio.to_thread(source.cleanup)
+            self.reaped[reason] += 1
+            REAPED.inc(reason=reason)
+            reaped += 1
+        if reaped:
+            logger.info(f"🧹 {reaped} processus FFmpeg récupéré(s).")
+        return reaped
+
+    def stats(self) -> dict:
+        return {
+            'running': len(self.sources),
+            'limit': self.limiter.capacity,
+            'waiting': self.limiter.waiting,
+            'guilds_waiting': len(self.limiter.rotation),
+            'reaped': dict(self.reaped),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            sources = list(self.sources)
+        for source in sources:
+            source.cleanup()
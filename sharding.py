@@ -0,0 +1,132 @@
+"""
+Superviseur multi-processus : répartit les shards Discord entre plusieurs processus bot.py.
+
+    SHARD_COUNT=8 SHARD_PROCESSES=4 python sharding.py
+
+Chaque processus reçoit SHARD_IDS (ses shards) et SHARD_WORKER (son numéro) ; un processus qui
+tombe est relancé seul, avec un délai qui double à chaque crash rapproché. Les processus partagent
+le cache audio, les métadonnées et les sauvegardes SQLite : chacun ne touche qu'aux serveurs de ses shards.
+"""
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from config import SHARD_COUNT, SHARD_PROCESSES, SHARD_IDS, SHARD_RESTART_DELAY, SHARD_RESTART_MAX_DELAY
+
+logger = logging.getLogger("Sharding")
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+STABLE_AFTER = 600  # Un processus resté en vie aussi longtemps repart avec le délai de relance initial
+
+
+def shard_for_guild(guild_id: int, shard_count: int = SHARD_COUNT) -> int:
+    """Shard qui reçoit les événements d'un serveur (formule de Discord)."""
+    return (guild_id >> 22) % shard_count if shard_count > 1 else 0
+
+
+def owns_guild(guild_id: int) -> bool:
+    """Le serveur est-il géré par ce processus ? Toujours vrai sans sharding ou avec tous les shards."""
+    return not SHARD_IDS or shard_for_guild(guild_id) in SHARD_IDS
+
+
+def assign_shards(shard_count: int, processes: int) -> list:
+    """Répartit les shards en blocs contigus, un par processus."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for worker in range(processes):
+        end = start + size + (1 if worker < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+class Worker:
+    """Un processus bot.py et l'état de ses relances."""
+
+    def __init__(self, worker_id: int, shard_ids: list):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.process = None
+        self.started_at = 0.0
+        self.restart_at = 0.0  # Instant de la prochaine relance (0 = pas de relance prévue)
+        self.delay = SHARD_RESTART_DELAY
+        self.restarts = 0
+
+    def start(self):
+        env = dict(os.environ, SHARD_COUNT=str(SHARD_COUNT), SHARD_WORKER=str(self.worker_id),
+                   SHARD_IDS=",".join(map(str, self.shard_ids)))
+        self.process = subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+        self.started_at = time.monotonic()
+        self.restart_at = 0.0
+        logger.info(f"🚀 Processus {self.worker_id} lancé (PID {self.process.pid}, shards {self.shard_ids}).")
+
+    def check(self, now: float):
+        """Relance le processus s'il est tombé, après le délai de relance."""
+        if self.is_alive():
+            return
+        if self.restart_at == 0.0:
+            code = self.process.returncode if self.process else None
+            if now - self.started_at > STABLE_AFTER:
+                self.delay = SHARD_RESTART_DELAY
+            logger.error(f"❌ Processus {self.worker_id} arrêté (code {code}), relance dans {self.delay:.0f} s.")
+            self.restart_at = now + self.delay
+            self.delay = min(self.delay * 2, SHARD_RESTART_MAX_DELAY)
+        elif now >= self.restart_at:
+            self.restarts += 1
+            self.start()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def terminate(self):
+        """Demande un arrêt propre : les cogs sauvegardent leurs files en se déchargeant."""
+        if self.is_alive():
+            self.process.terminate()
+
+    def wait(self, deadline: float):
+        """Attend la fin du processus, puis le force à s'arrêter passé `deadline`."""
+        if not self.is_alive():
+            return
+        try:
+            self.process.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.warning(f"⚠️ Processus {self.worker_id} bloqué, arrêt forcé.")
+            self.process.kill()
+
+
+class Supervisor:
+    def __init__(self, shard_count: int = SHARD_COUNT, processes: int = SHARD_PROCESSES):
+        self.workers = [Worker(i, shards) for i, shards in enumerate(assign_shards(shard_count, processes))]
+        self.running = True
+
+    def request_stop(self, *_):
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        for worker in self.workers:
+            worker.start()
+        try:
+            while self.running:
+                now = time.monotonic()
+                for worker in self.workers:
+                    worker.check(now)
+                time.sleep(1)
+        finally:
+            logger.info("🛑 Arrêt des processus...")
+            for worker in self.workers:
+                worker.terminate()
+            deadline = time.monotonic() + 30
+            for worker in self.workers:
+                worker.wait(deadline)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]: %(message)s")
+    if SHARD_COUNT < 2:
+        sys.exit("❌ SHARD_COUNT doit valoir au moins 2 pour lancer plusieurs processus (sinon : python bot.py).")
+    Supervisor().run()
@@ -0,0 +1,87 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from config import TRACK_INDEX_FILE
+
+logger = logging.getLogger("TrackIndex")
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class TrackIndex:
+    """Index plein texte (SQLite FTS5) des pistes déjà jouées, pour l'autocomplétion de /play.
+
+    Les recherches restent locales et rapides (l'autocomplétion doit répondre en moins de 3 secondes) ;
+    les pistes souvent jouées passent en premier à pertinence égale. Partagé entre les processus du bot.
+    """
+
+    def __init__(self, path: str = TRACK_INDEX_FILE):
+        self._lock = threading.Lock()  # Appelé via asyncio.to_thread
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tracks (video_id TEXT PRIMARY KEY, title TEXT NOT NULL, duration REAL, "
+            "plays INTEGER NOT NULL DEFAULT 0, last_played REAL NOT NULL)"
+        )
+        # Table FTS externe : le texte reste dans `tracks`, les déclencheurs tiennent l'index à jour
+        self.db.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+                title, content='tracks', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+                INSERT INTO tracks_fts (rowid, title) VALUES (new.rowid, new.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+                INSERT INTO tracks_fts (tracks_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE OF title ON tracks BEGIN
+                INSERT INTO tracks_fts (tracks_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+                INSERT INTO tracks_fts (rowid, title) VALUES (new.rowid, new.title);
+            END;
+        """)
+        self.db.commit()
+
+    def record(self, video_id: str, title: str, duration: float = None):
+        """Ajoute une piste jouée à l'index (ou compte une écoute de plus)."""
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT INTO tracks (video_id, title, duration, plays, last_played) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (video_id) DO UPDATE SET title = excluded.title, "
+                "duration = COALESCE(excluded.duration, duration), plays = plays + 1, last_played = excluded.last_played",
+                (video_id, title, duration, time.time()),
+            )
+
+    @staticmethod
+    def match_expression(query: str, prefix: bool = True):
+        """Requête FTS5 : tous les mots de la recherche, le dernier en préfixe (saisie en cours)."""
+        words = WORD.findall(query)
+        if not words:
+            return None
+        terms = [f'"{word}"' for word in words]
+        if prefix:
+            terms[-1] += "*"
+        return " ".join(terms)
+
+    def search(self, query: str, limit: int = 25, prefix: bool = True) -> list:
+        """Retourne les pistes qui correspondent à la recherche : [{'id', 'title', 'duration'}]."""
+        expression = self.match_expression(query, prefix)
+        if expression is None:
+            return []
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT tracks.video_id, tracks.title, tracks.duration FROM tracks_fts "
+                "JOIN tracks ON tracks.rowid = tracks_fts.rowid WHERE tracks_fts MATCH ? "
+                "ORDER BY tracks_fts.rank, tracks.plays DESC LIMIT ?",
+                (expression, limit),
+            ).fetchall()
+        return [{'id': video_id, 'title': title, 'duration': duration} for video_id, title, duration in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.db.close()
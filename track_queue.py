@@ -0,0 +1,194 @@
+import random
+import time
+from collections import deque
+from itertools import islice
+
+
+class Track:
+    """Entrée compacte de la file : seulement ce qu'il faut pour lire la piste et répondre dans le salon."""
+    __slots__ = ("url", "title", "requester_id", "channel_id", "start_at", "queued_at")
+
+    def __init__(self, url: str, title: str = None, requester_id: int = None, channel_id: int = None,
+                 start_at: float = 0.0):
+        self.url = url
+        self.title = title  # Inconnu tant que la piste n'a pas été résolue (sauf pour les playlists)
+        self.requester_id = requester_id
+        self.channel_id = channel_id  # Salon texte où annoncer la lecture
+        self.start_at = start_at  # Position de départ en secondes (reprise après redémarrage)
+        self.queued_at = time.monotonic()  # Pour mesurer l'attente dans la file
+
+    def to_row(self) -> tuple:
+        """Métadonnées sauvegardées (voir queue_handler.QueueStore)."""
+        return (self.url, self.title, self.requester_id, self.channel_id)
+
+    @property
+    def label(self) -> str:
+        return self.title or self.url
+
+    def __repr__(self):
+        return f"Track({self.label!r}, requester_id={self.requester_id})"
+
+
+class TrackQueue:
+    """
+    File d'attente des pistes d'un serveur, ajout et retrait en O(1).
+
+    En mode équitable, chaque utilisateur a sa propre file et les pistes sont servies à tour de rôle,
+    de sorte qu'une personne qui ajoute une playlist entière ne bloque pas les autres.
+    """
+
+    def __init__(self, fair: bool = False):
+        self._tracks = deque()  # Mode normal : ordre de lecture
+        self._by_user = {}  # Mode équitable : requester_id -> deque de pistes
+        self._turns = deque()  # Mode équitable : ordre de passage des utilisateurs
+        self._fair = False
+        self._size = 0
+        self.version = 0  # Incrémenté à chaque modification, pour savoir quand sauvegarder
+        self.fair = fair
+
+    @property
+    def fair(self) -> bool:
+        return self._fair
+
+    @fair.setter
+    def fair(self, enabled: bool):
+        """Active ou désactive le tour de rôle en conservant l'ordre de lecture actuel autant que possible."""
+        if enabled == self._fair:
+            return
+        tracks = list(self)
+        self._tracks.clear()
+        self._by_user.clear()
+        self._turns.clear()
+        self._fair = enabled
+        self._size = 0
+        self.extend(tracks)
+        self.version += 1
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __iter__(self):
+        """Parcourt les pistes dans l'ordre où elles seront lues."""
+        if not self._fair:
+            return iter(self._tracks)
+        return self._fair_order()
+
+    def _fair_order(self):
+        iterators = [iter(self._by_user[user_id]) for user_id in self._turns]
+        while iterators:
+            remaining = []
+            for iterator in iterators:
+                track = next(iterator, None)
+                if track is not None:
+                    yield track
+                    remaining.append(iterator)
+            iterators = remaining
+
+    def __getitem__(self, index: int) -> Track:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("Position hors de la file")
+        if not self._fair:
+            return self._tracks[index]
+        return next(islice(self, index, None))
+
+    def peek(self, count: int) -> list:
+        """Retourne les `count` prochaines pistes sans les retirer."""
+        return list(islice(self, count))
+
+    def append(self, track: Track):
+        if self._fair:
+            user_tracks = self._by_user.get(track.requester_id)
+            if user_tracks is None:
+                user_tracks = self._by_user[track.requester_id] = deque()
+                self._turns.append(track.requester_id)
+            user_tracks.append(track)
+        else:
+            self._tracks.append(track)
+        self._size += 1
+        self.version += 1
+
+    def extend(self, tracks):
+        for track in tracks:
+            self.append(track)
+
+    def popleft(self) -> Track:
+        if not self._size:
+            raise IndexError("La file est vide")
+        if self._fair:
+            user_id = self._turns.popleft()
+            user_tracks = self._by_user[user_id]
+            track = user_tracks.popleft()
+            if user_tracks:
+                self._turns.append(user_id)
+            else:
+                del self._by_user[user_id]
+        else:
+            track = self._tracks.popleft()
+        self._size -= 1
+        self.version += 1
+        return track
+
+    def clear(self):
+        self._tracks.clear()
+        self._by_user.clear()
+        self._turns.clear()
+        self._size = 0
+        self.version += 1
+
+    def remove(self, index: int) -> Track:
+        """Retire et retourne la piste à la position `index` (0 = prochaine piste)."""
+        track = self[index]
+        if self._fair:
+            user_tracks = self._by_user[track.requester_id]
+            user_tracks.remove(track)
+            if not user_tracks:
+                del self._by_user[track.requester_id]
+                self._turns.remove(track.requester_id)
+        else:
+            del self._tracks[index if index >= 0 else index + self._size]
+        self._size -= 1
+        self.version += 1
+        return track
+
+    def move(self, source: int, destination: int) -> Track:
+        """Déplace une piste ; impossible en mode équitable où l'ordre est imposé par le tour de rôle."""
+        if self._fair:
+            raise ValueError("Impossible de déplacer une piste en mode équitable")
+        track = self.remove(source)
+        destination = max(0, min(destination, self._size))
+        self._tracks.insert(destination, track)
+        self._size += 1
+        self.version += 1
+        return track
+
+    def shuffle(self):
+        """Mélange la file (en mode équitable, chaque utilisateur garde son tour mais ses pistes sont mélangées)."""
+        queues = self._by_user.values() if self._fair else (self._tracks,)
+        for tracks in queues:
+            shuffled = list(tracks)
+            random.shuffle(shuffled)
+            tracks.clear()
+            tracks.extend(shuffled)
+        self.version += 1
+
+    def dedupe(self) -> int:
+        """Retire les pistes en double (même URL) en gardant la première ; retourne le nombre retiré."""
+        seen = set()
+        kept = []
+        for track in self:
+            if track.url not in seen:
+                seen.add(track.url)
+                kept.append(track)
+        removed = self._size - len(kept)
+        if removed:
+            fair = self._fair
+            self._fair = False
+            self.clear()
+            self.extend(kept)
+            self.fair = fair
+        return removed
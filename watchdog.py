@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from config import WATCHDOG_THRESHOLD, WATCHDOG_SAMPLE_INTERVAL
+import metrics
+
+logger = logging.getLogger("Watchdog")
+
+MAX_STACKS = 2000  # Piles distinctes gardées en mémoire pour les blocages
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+ASYNCIO_HANDLE_RUN = asyncio.events.Handle._run.__code__  # Appel de chaque callback par la boucle
+
+BLOCKS = metrics.counter("bot_loop_blocked_total", "Blocages de la boucle d'événements au-delà du seuil, par origine.")
+BLOCK_SECONDS = metrics.histogram("bot_loop_blocked_seconds", "Durée des blocages de la boucle d'événements.")
+
+
+def collapse_stack(frame) -> str:
+    """Pile au format « replié » (racine;...;feuille) compris par flamegraph.pl et speedscope."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def blame(frame) -> str:
+    """
+    Retrouve le code du bot en cause : point d'entrée (commande, bouton, tâche) et fonction la plus profonde.
+
+    Seuls les objets code sont lus : accéder aux variables locales d'un thread en cours d'exécution n'est pas sûr.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        if code is ASYNCIO_HANDLE_RUN:
+            break  # Au-delà, c'est la boucle elle-même (et bot.py qui l'a lancée)
+        if os.path.dirname(os.path.abspath(code.co_filename)) == PROJECT_DIR:
+            names.append(getattr(code, "co_qualname", code.co_name))
+        frame = frame.f_back
+    if not names:
+        return "inconnu"
+    return names[-1] if len(names) == 1 else f"{names[-1]} → {names[0]}"
+
+
+class LoopWatchdog:
+    """
+    Détecte les blocages de la boucle asyncio depuis un thread séparé.
+
+    Une coroutine met à jour `last_beat` à intervalle court ; si le thread la voit en retard de plus de
+    `threshold`, il échantillonne la pile du thread de la boucle jusqu'à ce qu'elle reprenne, puis
+    journalise la pile la plus fréquente et la commande en cause.
+    """
+
+    def __init__(self, threshold: float = WATCHDOG_THRESHOLD, sample_interval: float = WATCHDOG_SAMPLE_INTERVAL):
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.beat_interval = min(threshold / 4, 0.05)
+        self.loop_thread_id = threading.get_ident()  # Construit depuis le thread de la boucle
+        self.last_beat = time.monotonic()
+        self.blocked_stacks = Counter()  # Échantillons cumulés pendant les blocages
+        self._profile = None  # Échantillons d'un profilage demandé, None hors profilage
+        self._stop = threading.Event()
+        self._beat_task = None
+        self._thread = None
+
+    def start(self):
+        self._beat_task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"🐕 Surveillance de la boucle activée (seuil {self.threshold * 1000:.0f} ms).")
+
+    def stop(self):
+        self._stop.set()
+        if self._beat_task:
+            self._beat_task.cancel()
+
+    async def _beat(self):
+        while True:
+            self.last_beat = time.monotonic()
+            await asyncio.sleep(self.beat_interval)
+
+    def _run(self):
+        block_start = None
+        block_samples = Counter()
+        culprit = None
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            profile = self._profile
+            if profile is not None:
+                profile[collapse_stack(frame)] += 1
+
+            last_beat = self.last_beat
+            if time.monotonic() - last_beat > self.threshold + self.beat_interval:
+                if block_start is None:
+                    block_start = last_beat
+                    block_samples = Counter()
+                    culprit = blame(frame)
+                block_samples[collapse_stack(frame)] += 1
+            elif block_start is not None:
+                self._report(last_beat - block_start, block_samples, culprit)
+                block_start = None
+            del frame
+
+    def _report(self, duration: float, samples: Counter, culprit: str):
+        BLOCKS.inc(origin=culprit)
+        BLOCK_SECONDS.observe(duration)
+        for stack, count in samples.items():
+            if stack in self.blocked_stacks or len(self.blocked_stacks) < MAX_STACKS:
+                self.blocked_stacks[stack] += count
+        stack, count = samples.most_common(1)[0]
+        frames = stack.split(";")
+        logger.warning(
+            f"🐢 Boucle bloquée {duration * 1000:.0f} ms par {culprit} ({count}/{sum(samples.values())} échantillons) :\n"
+            + "\n".join(f"    {name}" for name in frames[-15:])
+        )
+
+    async def profile(self, seconds: float) -> str:
+        """Échantillonne la boucle pendant `seconds` et retourne le profil au format replié."""
+        self._profile = Counter()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile, self._profile = self._profile, None
+        return self.format_profile(profile)
+
+    def format_profile(self, samples: Counter = None) -> str:
+        """Profil replié (une pile et son nombre d'échantillons par ligne) ; par défaut, les blocages cumulés."""
+        samples = self.blocked_stacks if samples is None else samples
+        return "\n".join(f"{stack} {count}" for stack, count in samples.most_common()) + "\n"
+
+
+_watchdog = None
+
+
+def start() -> LoopWatchdog:
+    """Démarre la surveillance (une seule fois par processus)."""
+    global _watchdog
+    if _watchdog is None:
+        _watchdog = LoopWatchdog()
+        _watchdog.start()
+    return _watchdog
+
+
+def get():
+    """Retourne la surveillance active, ou None si elle n'est pas activée."""
+    return _watchdog